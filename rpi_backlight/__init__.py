@@ -1,18 +1,31 @@
 import errno
+import hashlib
+import json
+import math
+import os
+import queue
+import threading
 import time
+import weakref
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from contextlib import contextmanager
 from enum import Enum
 from os import PathLike
 from pathlib import Path
+from statistics import median
 from tempfile import gettempdir
-from typing import Generator, Union, Optional
+from typing import Any, Callable, Dict, Generator, Union, Optional, TYPE_CHECKING
 from glob import iglob
 
 from . import utils
 
+if TYPE_CHECKING:
+    from .status import StatusPage
+    from .thermal import ThermalGovernor
+
 __author__ = "Linus Groh"
 __version__ = "2.7.0"
-__all__ = ["Backlight", "BoardType"]
+__all__ = ["Backlight", "BacklightTimeoutError", "BoardType"]
 
 
 class BoardType(Enum):
@@ -36,6 +49,50 @@ _BACKLIGHT_SYSFS_PATHS = {
 }
 _EMULATOR_SYSFS_TMP_FILE_PATH = Path(gettempdir()) / "rpi-backlight-emulator.sysfs"
 _EMULATOR_MAGIC_STRING = ":emulator:"
+# Retry reading a sysfs file that is empty (while being updated) this many times
+_READ_RETRIES = 100
+# Sleep between read retries grows by this much per retry, up to _READ_RETRY_MAX_DELAY
+_READ_RETRY_DELAY = 0.0005
+_READ_RETRY_MAX_DELAY = 0.01
+# Give up waiting for actual_brightness to match the written value after this
+_CALIBRATION_SETTLE_TIMEOUT = 1.0
+
+
+def _profile_path(backlight_sysfs_path: Path) -> Optional[Path]:
+    """Return the calibration profile file for the device at ``backlight_sysfs_path``,
+    None if there is no cache directory.
+    """
+    try:
+        cache_dir = (
+            Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+            / "rpi-backlight"
+        )
+    except (KeyError, RuntimeError):
+        # No HOME and no passwd entry, e.g. in a minimal container
+        return None
+    identity = str(backlight_sysfs_path.resolve())
+    return cache_dir / f"{hashlib.sha1(identity.encode()).hexdigest()[:16]}.json"
+
+
+class BacklightTimeoutError(TimeoutError):
+    """Raised when a sysfs read or write does not complete within the ``timeout``
+    passed to :class:`~rpi_backlight.Backlight`, or when a previous operation that
+    timed out is still pending.
+    """
+
+
+def _io_worker(requests: "queue.Queue") -> None:
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        future, func, args = request
+        if not future.set_running_or_notify_cancel():
+            continue
+        try:
+            future.set_result(func(*args))
+        except BaseException as e:
+            future.set_exception(e)
 
 
 def _permission_denied() -> None:
@@ -52,12 +109,31 @@ class Backlight:
         self,
         backlight_sysfs_path: Optional[Union[str, "PathLike[str]"]] = None,
         board_type: BoardType = utils.detect_board_type() or BoardType.RASPBERRY_PI,
+        status_page: Optional["StatusPage"] = None,
+        timeout: Optional[float] = None,
+        governor: Optional["ThermalGovernor"] = None,
     ):
-        """Set ``backlight_sysfs_path`` to ``":emulator:"`` to use with rpi-backlight-emulator."""
+        """Set ``backlight_sysfs_path`` to ``":emulator:"`` to use with rpi-backlight-emulator.
+
+        Pass a :class:`~rpi_backlight.status.StatusPage` as ``status_page`` to publish
+        every brightness and power change to it.
+
+        Set ``timeout`` (in seconds) to run sysfs reads and writes in a worker thread
+        and raise :class:`~rpi_backlight.BacklightTimeoutError` if one takes longer,
+        e.g. when the I2C bus of a Tinker Board display is stuck. Until the stuck
+        operation completes, all further operations fail immediately. Operations from
+        several threads run one at a time, waiting for another thread's operation
+        doesn't count against the timeout.
+
+        Pass a :class:`~rpi_backlight.thermal.ThermalGovernor` as ``governor`` to cap
+        the brightness based on temperature and battery capacity.
+        """
         if not isinstance(board_type, BoardType):
             raise TypeError(
                 f"board_type must be a member of the BoardType enum, got {type(board_type)}"
             )
+        if timeout is not None and timeout <= 0:
+            raise ValueError(f"timeout must be > 0, got {timeout}")
 
         if not backlight_sysfs_path:
             backlight_sysfs_path = _BACKLIGHT_SYSFS_PATHS[board_type]
@@ -74,6 +150,23 @@ class Backlight:
         self._backlight_sysfs_path = Path(backlight_sysfs_path)
         self._board_type = board_type
         self._fade_duration = 0.0  # in seconds
+        self._read_retries = 0
+        self._timeout = timeout
+        self._timeout_count = 0
+        # Operation that timed out and is still running in the worker thread
+        self._pending_io: Optional[Future] = None
+        self._io_requests: Optional[queue.Queue] = None
+        # Held while an operation runs in the worker thread, so the deadline only
+        # covers the operation itself and not waiting for other threads
+        self._io_lock = threading.Lock()
+        self._governor = governor
+        # Brightness last set by the user before applying the ceiling, and the
+        # brightness last written by this instance, so the governor can restore it
+        self._requested_brightness: Optional[float] = None
+        self._written_brightness: Optional[int] = None
+        # Loaded on first use
+        self._profile: Optional[Dict[str, Any]] = None
+        self._profile_loaded = False
 
         if self._board_type in (
             BoardType.RASPBERRY_PI,
@@ -87,26 +180,145 @@ class Backlight:
         ):
             self._max_brightness = 255
 
+        self._status_page = status_page
+        if self._status_page is not None:
+            self._status_page.update(
+                brightness=self.brightness, power=self.power, fading=False
+            )
+
+    def _run_io(self, func: Callable, *args: Any) -> Any:
+        if self._timeout is None:
+            return func(*args)
+        with self._io_lock:
+            if self._pending_io is not None:
+                if not self._pending_io.done():
+                    raise BacklightTimeoutError(
+                        errno.ETIMEDOUT,
+                        f"{self._backlight_sysfs_path} is not responding, "
+                        "a previous operation is still pending",
+                    )
+                # The device recovered
+                self._pending_io = None
+            if self._io_requests is None:
+                self._io_requests = queue.Queue()
+                threading.Thread(
+                    target=_io_worker,
+                    args=(self._io_requests,),
+                    name="rpi-backlight-io",
+                    daemon=True,
+                ).start()
+                # Stop the worker thread together with this instance
+                weakref.finalize(self, self._io_requests.put, None)
+            future: Future = Future()
+            # The worker is idle, so it picks this up right away
+            self._io_requests.put((future, func, args))
+            try:
+                return future.result(timeout=self._timeout)
+            except FutureTimeoutError:
+                if future.done():
+                    # Raised by func itself
+                    raise
+                self._pending_io = future
+                self._timeout_count += 1
+                raise BacklightTimeoutError(
+                    errno.ETIMEDOUT,
+                    f"{self._backlight_sysfs_path} did not respond within {self._timeout}s",
+                ) from None
+
     def _get_value(self, name: str) -> int:
-        try:
-            return int((self._backlight_sysfs_path / name).read_text())
-        except ValueError:
-            # Reading failed, sometimes file is empty when updating
-            # Try again
-            return self._get_value(name)
-        except (OSError, IOError) as e:
-            if e.errno == errno.EPERM:
-                _permission_denied()
-            raise e
+        retries = 0
+        while True:
+            try:
+                return int(self._run_io((self._backlight_sysfs_path / name).read_text))
+            except ValueError:
+                # Reading failed, sometimes file is empty when updating
+                # Try again, but don't spin forever on a file with invalid content
+                if retries >= _READ_RETRIES:
+                    raise
+                time.sleep(min(retries * _READ_RETRY_DELAY, _READ_RETRY_MAX_DELAY))
+                retries += 1
+                self._read_retries += 1
+            except (OSError, IOError) as e:
+                if e.errno == errno.EPERM:
+                    _permission_denied()
+                raise e
 
     def _set_value(self, name: str, value: int) -> None:
         try:
-            (self._backlight_sysfs_path / name).write_text(str(value))
+            self._run_io((self._backlight_sysfs_path / name).write_text, str(value))
         except (OSError, IOError) as e:
             if e.errno == errno.EPERM:
                 _permission_denied()
             raise e
 
+    def _update_status(
+        self,
+        brightness: Optional[float] = None,
+        power: Optional[bool] = None,
+        fading: Optional[bool] = None,
+    ) -> None:
+        if self._status_page is None:
+            return
+        if brightness is not None:
+            raw_brightness = self._denormalize_brightness(brightness)
+            brightness = self._normalize_brightness(raw_brightness)
+            if self._board_type in (
+                BoardType.TINKER_BOARD,
+                BoardType.TINKER_BOARD_2,
+            ):
+                # Tinker Board has no separate power file
+                power = bool(raw_brightness)
+        self._status_page.update(brightness=brightness, power=power, fading=fading)
+
+    def _load_profile(self) -> Optional[Dict[str, Any]]:
+        path = _profile_path(self._backlight_sysfs_path)
+        if path is None:
+            return None
+        try:
+            profile = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(profile, dict):
+            return None
+        # Guard against hash collisions and moved devices
+        if profile.get("sysfs_path") != str(self._backlight_sysfs_path.resolve()):
+            return None
+        # Don't let a corrupted or hand-edited profile break fading
+        for key in ("write_latency", "read_latency", "settle_time", "max_step_rate"):
+            value = profile.get(key)
+            if (
+                not isinstance(value, (int, float))
+                or isinstance(value, bool)
+                or not math.isfinite(value)
+                or value < 0
+            ):
+                return None
+        if profile["max_step_rate"] <= 0:
+            return None
+        return profile
+
+    def _write_brightness(self, value: float, fading: Optional[bool] = None) -> None:
+        # Write without fading, independent of fade_duration
+        if self._board_type in (
+            BoardType.RASPBERRY_PI,
+            BoardType.GENERIC,
+        ):
+            self._set_value("brightness", self._denormalize_brightness(value))
+        elif (
+            self._board_type == BoardType.TINKER_BOARD
+            or self._board_type == BoardType.TINKER_BOARD_2
+        ):
+            self._set_value("tinker_mcu_bl", self._denormalize_brightness(value))
+        else:
+            raise RuntimeError("Invalid board type")
+        self._written_brightness = self._normalize_brightness(
+            self._denormalize_brightness(value)
+        )
+        self._update_status(brightness=value, fading=fading)
+
+    def _ceiling(self) -> float:
+        return 100.0 if self._governor is None else self._governor.ceiling()
+
     def _normalize_brightness(self, value: float) -> int:
         return max(min(100, int(round(value / self._max_brightness * 100))), 0)
 
@@ -131,6 +343,124 @@ class Backlight:
         yield
         self.fade_duration = old_duration
 
+    @property
+    def profile(self) -> Optional[Dict[str, Any]]:
+        """The calibration profile of the device, None if not calibrated.
+        Also see :meth:`~rpi_backlight.Backlight.calibrate`.
+
+        :getter: Return the calibration profile.
+        :type: dict
+        """
+        if not self._profile_loaded:
+            self._profile = self._load_profile()
+            self._profile_loaded = True
+        return self._profile
+
+    def calibrate(self, samples: int = 10) -> Dict[str, Any]:
+        """Measure the sysfs write and read latency and the time until the written
+        brightness shows up in ``actual_brightness``, and save the result as the
+        device's calibration profile.
+
+        Fades use the profile to choose the highest step rate the device can sustain
+        without exceeding the fade duration. The brightness alternates by one step
+        during calibration and is restored afterwards. The profile is saved in
+        ``$XDG_CACHE_HOME/rpi-backlight``, or only kept by this instance if there is no
+        writable cache directory.
+
+        Raises :class:`RuntimeError` if the display is off, or if the written
+        brightness doesn't show up within a second for at least half of the
+        ``samples``, e.g. because ``actual_brightness`` doesn't track ``brightness``.
+
+        >>> backlight = Backlight()
+        >>> profile = backlight.calibrate()
+        >>> profile["max_step_rate"]  # Steps per second
+        6012.0
+        """
+        if samples < 1:
+            raise ValueError(f"samples must be >= 1, got {samples}")
+        if self._board_type in (
+            BoardType.RASPBERRY_PI,
+            BoardType.GENERIC,
+        ):
+            write_name, read_name = "brightness", "actual_brightness"
+        elif (
+            self._board_type == BoardType.TINKER_BOARD
+            or self._board_type == BoardType.TINKER_BOARD_2
+        ):
+            write_name = read_name = "tinker_mcu_bl"
+        else:
+            raise RuntimeError("Invalid board type")
+        if not self.power:
+            raise RuntimeError("Display must be powered on for calibration")
+
+        original = self._get_value(write_name)
+        other = original - 1 if original > 0 else original + 1
+        write_latencies = []
+        read_latencies = []
+        settle_times = []
+        timeouts = 0
+        try:
+            for i in range(samples):
+                raw_value = other if i % 2 == 0 else original
+                start = time.perf_counter()
+                self._set_value(write_name, raw_value)
+                written = time.perf_counter()
+                write_latencies.append(written - start)
+                while True:
+                    read_start = time.perf_counter()
+                    actual = self._get_value(read_name)
+                    read_end = time.perf_counter()
+                    read_latencies.append(read_end - read_start)
+                    if actual == raw_value:
+                        settle_times.append(read_end - written)
+                        break
+                    if read_end - written > _CALIBRATION_SETTLE_TIMEOUT:
+                        timeouts += 1
+                        break
+                # Don't save a profile based on timeouts
+                if timeouts * 2 >= samples:
+                    raise RuntimeError(
+                        f"{read_name} did not follow {write_name} in {timeouts} of "
+                        f"{i + 1} samples, not calibrating"
+                    )
+        finally:
+            self._set_value(write_name, original)
+
+        write_latency = median(write_latencies)
+        settle_time = median(settle_times)
+        profile = {
+            "sysfs_path": str(self._backlight_sysfs_path.resolve()),
+            "write_latency": write_latency,
+            "read_latency": median(read_latencies),
+            "settle_time": settle_time,
+            # A step takes the write plus the time until it's visible
+            "max_step_rate": 1 / max(write_latency + settle_time, 1e-6),
+        }
+        path = _profile_path(self._backlight_sysfs_path)
+        if path is not None:
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(json.dumps(profile, indent=4))
+            except OSError:
+                # Read-only cache directory, keep the profile for this instance
+                pass
+        self._profile = profile
+        self._profile_loaded = True
+        return profile
+
+    @property
+    def timeout_count(self) -> int:
+        """The number of sysfs operations that did not complete within ``timeout``.
+
+        >>> backlight = Backlight(timeout=0.5)
+        >>> backlight.timeout_count
+        0
+
+        :getter: Return the number of timed out operations.
+        :type: int
+        """
+        return self._timeout_count
+
     @property
     def fade_duration(self) -> float:
         """The brightness fade duration in seconds, defaults to 0.
@@ -191,46 +521,31 @@ class Backlight:
             raise TypeError(f"value must be a number, got {type(value)}")
         if value < 0 or value > 100:
             raise ValueError(f"value must be in range 0-100, got {value}")
+        self._requested_brightness = value
+        value = min(value, self._ceiling())
         if self.fade_duration > 0:
             current_value = self.brightness
-            step = 1 if current_value < value else -1
-            diff = abs(value - current_value)
-            while (
-                0.0 <= current_value
-                and current_value != value
-                and current_value <= 100.0
-            ):
-                current_value += step
-                if self._board_type in (
-                    BoardType.RASPBERRY_PI,
-                    BoardType.GENERIC,
-                ):
-                    self._set_value(
-                        "brightness", self._denormalize_brightness(current_value)
-                    )
-                elif (
-                    self._board_type == BoardType.TINKER_BOARD
-                    or self._board_type == BoardType.TINKER_BOARD_2
-                ):
-                    self._set_value(
-                        "tinker_mcu_bl", self._denormalize_brightness(current_value)
-                    )
-                else:
-                    raise RuntimeError("Invalid board type")
-                time.sleep(self.fade_duration / diff)
+            # One step per percent, unless the device can't keep up with that
+            steps = math.ceil(abs(value - current_value))
+            profile = self.profile
+            if profile is not None:
+                max_steps = int(self.fade_duration * profile["max_step_rate"])
+                steps = max(1, min(steps, max_steps))
+            start = time.monotonic()
+            try:
+                for i in range(1, steps + 1):
+                    step_value = current_value + (value - current_value) * i / steps
+                    # The ceiling may drop while fading
+                    step_value = min(step_value, self._ceiling())
+                    self._write_brightness(step_value, fading=True)
+                    # Sleep until the step's deadline so slow writes don't add up
+                    delay = start + self.fade_duration * i / steps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+            finally:
+                self._update_status(fading=False)
         else:
-            if self._board_type in (
-                BoardType.RASPBERRY_PI,
-                BoardType.GENERIC,
-            ):
-                self._set_value("brightness", self._denormalize_brightness(value))
-            elif (
-                self._board_type == BoardType.TINKER_BOARD
-                or self._board_type == BoardType.TINKER_BOARD_2
-            ):
-                self._set_value("tinker_mcu_bl", self._denormalize_brightness(value))
-            else:
-                raise RuntimeError("Invalid board type")
+            self._write_brightness(value)
 
     @property
     def power(self) -> bool:
@@ -270,10 +585,14 @@ class Backlight:
         ):
             # 0 is on, 1 is off
             self._set_value("bl_power", int(not on))
+            self._update_status(power=on)
         elif (
             self._board_type == BoardType.TINKER_BOARD
             or self._board_type == BoardType.TINKER_BOARD_2
         ):
-            self._set_value("tinker_mcu_bl", 255 if on else 0)
+            # Powering on sets the brightness, so respect the ceiling
+            brightness = self._ceiling() if on else 0
+            self._set_value("tinker_mcu_bl", self._denormalize_brightness(brightness))
+            self._update_status(brightness=brightness)
         else:
             raise RuntimeError("Invalid board type")
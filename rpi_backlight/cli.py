@@ -1,6 +1,7 @@
 from argparse import ArgumentParser
 
 from . import Backlight, BoardType, __version__, utils
+from .status import DEFAULT_STATUS_PATH, StatusPage
 
 STRING_TO_BOARD_TYPE = {
     "raspberry-pi": BoardType.RASPBERRY_PI,
@@ -56,6 +57,18 @@ def _create_argument_parser():
     parser.add_argument(
         "-d", "--duration", type=float, default=0, help="fading duration in seconds"
     )
+    parser.add_argument(
+        "--status-page",
+        metavar="PATH",
+        nargs="?",
+        const=str(DEFAULT_STATUS_PATH),
+        help=f"publish changes to a status page (default path: {DEFAULT_STATUS_PATH})",
+    )
+    parser.add_argument(
+        "--calibrate",
+        action="store_true",
+        help="measure the display latency to choose the fastest fading step rate",
+    )
     parser.add_argument(
         "-B",
         "--board-type",
@@ -77,11 +90,37 @@ def main():
     parser = _create_argument_parser()
     args = parser.parse_args()
 
+    status_page = None
+    if args.status_page:
+        try:
+            status_page = StatusPage(args.status_page)
+        except OSError as e:
+            parser.error(f"cannot open status page: {e}")
+
     backlight = Backlight(
         board_type=STRING_TO_BOARD_TYPE[args.board_type],
         backlight_sysfs_path=args.sysfs_path,
+        status_page=status_page,
     )
 
+    if args.calibrate:
+        if any(
+            (
+                args.get_brightness,
+                args.set_brightness is not None,
+                args.get_power,
+                args.set_power,
+                args.duration,
+            )
+        ):
+            parser.error("--calibrate must be used without other options")
+        profile = backlight.calibrate()
+        print(f"write latency: {profile['write_latency'] * 1000:.3f}ms")
+        print(f"read latency: {profile['read_latency'] * 1000:.3f}ms")
+        print(f"settle time: {profile['settle_time'] * 1000:.3f}ms")
+        print(f"max fade step rate: {profile['max_step_rate']:.0f} steps/s")
+        return
+
     if args.get_brightness:
         if any((args.set_brightness, args.get_power, args.set_power, args.duration)):
             parser.error("--get-brightness must be used without other options")
@@ -0,0 +1,261 @@
+import os
+import selectors
+import struct
+import time
+from enum import Enum
+from glob import iglob
+from typing import Dict, Iterable, List, Optional, Union
+
+from . import Backlight
+
+__all__ = ["IdleDimmer", "IdleState", "pack_input_event"]
+
+#: Layout of ``struct input_event`` from ``linux/input.h``
+#: (``struct timeval``, ``__u16 type``, ``__u16 code``, ``__s32 value``).
+INPUT_EVENT_FORMAT = "llHHi"
+INPUT_EVENT_SIZE = struct.calcsize(INPUT_EVENT_FORMAT)
+
+_DEFAULT_INPUT_DEVICES = "/dev/input/event*"
+# Read this many events per os.read() when draining a device
+_READ_EVENTS = 64
+# Look for new or unplugged devices to come back this often (in seconds)
+_RESCAN_INTERVAL = 1.0
+
+
+def pack_input_event(
+    type_: int = 0, code: int = 0, value: int = 0, timestamp: Optional[float] = None
+) -> bytes:
+    """Pack a synthetic ``struct input_event``, e.g. to write into a pipe passed to
+    :class:`~rpi_backlight.idle.IdleDimmer` for testing.
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    seconds = int(timestamp)
+    microseconds = int((timestamp - seconds) * 1_000_000)
+    return struct.pack(INPUT_EVENT_FORMAT, seconds, microseconds, type_, code, value)
+
+
+class IdleState(Enum):
+    """State of the display as managed by :class:`~rpi_backlight.idle.IdleDimmer`."""
+
+    #: Input was seen recently, display is at its normal brightness
+    ACTIVE = 1
+    #: No input for ``dim_after`` seconds, display is dimmed
+    DIMMED = 2
+    #: No input for ``off_after`` seconds, display is powered off
+    OFF = 3
+
+
+class IdleDimmer:
+    """Dim and power off the display after a period without input, wake it on the
+    next input event.
+
+    Input devices are watched with :mod:`selectors` (``epoll`` on Linux), so no CPU
+    time is used while waiting. Once the display is off, the dimmer blocks until the
+    next event arrives.
+
+    >>> backlight = Backlight()
+    >>> dimmer = IdleDimmer(backlight, dim_after=30, off_after=120)
+    >>> dimmer.run()  # Blocks until dimmer.stop() is called from another thread
+
+    ``devices`` can be paths or already opened file descriptors, e.g. the read end of
+    a pipe fed with :func:`~rpi_backlight.idle.pack_input_event`. Defaults to all
+    ``/dev/input/event*`` devices.
+
+    When a device given by path is unplugged, the dimmer tries to reopen it every
+    second until it is back. By default, ``/dev/input/event*`` is rescanned every
+    second, so devices plugged in after the dimmer started are watched as well. File
+    descriptors can't be reopened and are dropped once closed.
+    """
+
+    def __init__(
+        self,
+        backlight: Backlight,
+        dim_after: float,
+        off_after: Optional[float] = None,
+        dim_brightness: float = 10,
+        fade_duration: float = 0.5,
+        devices: Optional[Iterable[Union[str, int]]] = None,
+    ):
+        if dim_after < 0:
+            raise ValueError(f"dim_after must be >= 0, got {dim_after}")
+        if off_after is not None and off_after < dim_after:
+            raise ValueError(
+                f"off_after must be >= dim_after, got {off_after} < {dim_after}"
+            )
+        if dim_brightness < 0 or dim_brightness > 100:
+            raise ValueError(
+                f"dim_brightness must be in range 0-100, got {dim_brightness}"
+            )
+
+        self._backlight = backlight
+        self._dim_after = dim_after
+        self._off_after = off_after
+        self._dim_brightness = dim_brightness
+        self._fade_duration = fade_duration
+        self._state = IdleState.ACTIVE
+        self._restore_brightness: Optional[float] = None
+        self._last_input = time.monotonic()
+
+        self._selector = selectors.DefaultSelector()
+        # Devices opened by path, so they can be reopened after being unplugged
+        self._glob_devices = devices is None
+        self._device_paths: List[str] = []
+        self._opened: Dict[str, int] = {}
+        if devices is None:
+            devices = sorted(iglob(_DEFAULT_INPUT_DEVICES))
+        for device in devices:
+            if isinstance(device, int):
+                self._selector.register(device, selectors.EVENT_READ)
+            else:
+                self._device_paths.append(str(device))
+                self._open_device(str(device))
+        self._next_rescan = time.monotonic() + _RESCAN_INTERVAL
+
+        # Self-pipe used to interrupt select() from stop()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._stop_requested = False
+
+    @property
+    def state(self) -> IdleState:
+        """The current :class:`~rpi_backlight.idle.IdleState`."""
+        return self._state
+
+    def _next_timeout(self) -> Optional[float]:
+        if self._state == IdleState.ACTIVE:
+            deadline = self._last_input + self._dim_after
+        elif self._state == IdleState.DIMMED and self._off_after is not None:
+            deadline = self._last_input + self._off_after
+        else:
+            # Nothing left to do until the next input event
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    def _open_device(self, path: str) -> None:
+        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        self._opened[path] = fd
+        self._selector.register(fd, selectors.EVENT_READ)
+
+    def _needs_rescan(self) -> bool:
+        # New devices may show up at any time, e.g. a touch panel probed after boot
+        return self._glob_devices or len(self._opened) < len(self._device_paths)
+
+    def _rescan(self) -> None:
+        self._next_rescan = time.monotonic() + _RESCAN_INTERVAL
+        if self._glob_devices:
+            paths = sorted(iglob(_DEFAULT_INPUT_DEVICES))
+        else:
+            paths = self._device_paths
+        for path in paths:
+            if path in self._opened:
+                continue
+            try:
+                self._open_device(path)
+            except OSError:
+                # Not back yet
+                continue
+
+    def _drain(self, fd: int) -> bool:
+        """Read all pending events from ``fd``, return False if it was closed."""
+        try:
+            data = os.read(fd, INPUT_EVENT_SIZE * _READ_EVENTS)
+        except BlockingIOError:
+            return True
+        except OSError:
+            # Device was unplugged
+            data = b""
+        if not data:
+            self._selector.unregister(fd)
+            for path, opened_fd in list(self._opened.items()):
+                if opened_fd == fd:
+                    os.close(fd)
+                    del self._opened[path]
+            return False
+        return True
+
+    def _dim(self) -> None:
+        self._restore_brightness = self._backlight.brightness
+        if self._restore_brightness > self._dim_brightness:
+            with self._backlight.fade(duration=self._fade_duration):
+                self._backlight.brightness = self._dim_brightness
+        self._state = IdleState.DIMMED
+
+    def _power_off(self) -> None:
+        with self._backlight.fade(duration=self._fade_duration):
+            self._backlight.brightness = 0
+        self._backlight.power = False
+        self._state = IdleState.OFF
+
+    def _wake(self) -> None:
+        if self._state == IdleState.OFF:
+            self._backlight.power = True
+        if self._restore_brightness is not None:
+            with self._backlight.fade(duration=0):
+                self._backlight.brightness = self._restore_brightness
+            self._restore_brightness = None
+        self._state = IdleState.ACTIVE
+
+    def poll(self, timeout: Optional[float] = None) -> None:
+        """Wait for input for at most ``timeout`` seconds (or until the next state
+        transition is due) and update the display accordingly.
+        """
+        if self._needs_rescan() and time.monotonic() >= self._next_rescan:
+            self._rescan()
+        next_timeout = self._next_timeout()
+        if timeout is not None and (next_timeout is None or timeout < next_timeout):
+            next_timeout = timeout
+        if self._needs_rescan():
+            # Don't block forever while waiting for new or unplugged devices
+            rescan_timeout = max(0.0, self._next_rescan - time.monotonic())
+            if next_timeout is None or next_timeout > rescan_timeout:
+                next_timeout = rescan_timeout
+
+        had_input = False
+        for key, _ in self._selector.select(next_timeout):
+            if key.fd == self._wakeup_r:
+                os.read(self._wakeup_r, 1024)
+            elif self._drain(key.fd):
+                had_input = True
+
+        now = time.monotonic()
+        if had_input:
+            self._last_input = now
+            if self._state != IdleState.ACTIVE:
+                self._wake()
+        elif (
+            self._state == IdleState.ACTIVE
+            and now - self._last_input >= self._dim_after
+        ):
+            self._dim()
+        elif (
+            self._state == IdleState.DIMMED
+            and self._off_after is not None
+            and now - self._last_input >= self._off_after
+        ):
+            self._power_off()
+
+    def run(self) -> None:
+        """Watch for input until :meth:`~rpi_backlight.idle.IdleDimmer.stop` is called."""
+        self._last_input = time.monotonic()
+        while not self._stop_requested:
+            self.poll()
+        self._stop_requested = False
+
+    def stop(self) -> None:
+        """Stop :meth:`~rpi_backlight.idle.IdleDimmer.run`, safe to call from another thread."""
+        self._stop_requested = True
+        os.write(self._wakeup_w, b"\0")
+
+    def close(self) -> None:
+        """Close all file descriptors opened by the dimmer."""
+        self._selector.close()
+        for fd in list(self._opened.values()) + [self._wakeup_r, self._wakeup_w]:
+            os.close(fd)
+        self._opened = {}
+
+    def __enter__(self) -> "IdleDimmer":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
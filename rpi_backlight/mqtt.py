@@ -0,0 +1,321 @@
+import logging
+import queue
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import Backlight, __version__, utils
+from .cli import BOARD_TYPE_TO_STRING, STRING_TO_BOARD_TYPE
+from .status import DEFAULT_STATUS_PATH, StatusPage
+
+__all__ = ["MqttBridge"]
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _parse_brightness(payload: str) -> Optional[float]:
+    try:
+        value = float(payload)
+    except ValueError:
+        return None
+    return value if 0 <= value <= 100 else None
+
+
+def _combine_power(previous: Optional[str], payload: str) -> Optional[str]:
+    """Combine two power commands into one, None if they cancel each other out."""
+    if payload not in ("on", "off", "toggle"):
+        return previous
+    if payload != "toggle" or previous is None:
+        return payload
+    if previous == "toggle":
+        return None
+    return "off" if previous == "on" else "on"
+
+
+class MqttBridge:
+    """Expose a :class:`~rpi_backlight.Backlight` over MQTT using a single, persistent
+    broker connection.
+
+    Commands are received on ``<prefix>/brightness/set`` (0-100) and
+    ``<prefix>/power/set`` (``on``/``off``/``toggle``). The current state is
+    published, retained, on ``<prefix>/brightness`` and ``<prefix>/power``, but only
+    when it actually changed and at most once every ``debounce`` seconds, so a fade
+    publishes a bounded number of messages. Commands that queue up while a fade is
+    applied are coalesced, so only the latest brightness is faded to.
+
+    ``client`` is a connected ``paho.mqtt.client.Client`` or any object providing
+    ``subscribe()``, ``publish()`` and the ``on_connect``/``on_message`` callback
+    attributes, e.g. a broker stand-in for tests.
+
+    >>> client = paho.mqtt.client.Client()
+    >>> client.connect("localhost")
+    >>> client.loop_start()
+    >>> bridge = MqttBridge(Backlight(), client, prefix="kiosk/display")
+    >>> bridge.run()  # Blocks until bridge.stop() is called from another thread
+    """
+
+    def __init__(
+        self,
+        backlight: Backlight,
+        client: Any,
+        prefix: str = "rpi-backlight",
+        fade_duration: float = 0,
+        debounce: float = 0.5,
+    ):
+        if debounce <= 0:
+            raise ValueError(f"debounce must be > 0, got {debounce}")
+
+        self._backlight = backlight
+        self._client = client
+        self._prefix = prefix.rstrip("/")
+        self._fade_duration = fade_duration
+        self._debounce = debounce
+        self._commands: "queue.Queue[Optional[Tuple[str, str]]]" = queue.Queue()
+        self._changed = threading.Event()
+        self._stop_requested = threading.Event()
+        self._applying = threading.Event()
+        self._published_state: Optional[Tuple[int, bool]] = None
+        self._last_publish = 0.0
+
+        self._client.on_connect = self._on_connect
+        self._client.on_message = self._on_message
+        self._subscribe()
+
+    def _topic(self, name: str) -> str:
+        return f"{self._prefix}/{name}"
+
+    def _subscribe(self) -> None:
+        self._client.subscribe(self._topic("brightness/set"))
+        self._client.subscribe(self._topic("power/set"))
+
+    def _on_connect(self, *_) -> None:
+        # Subscriptions are lost when the broker connection is re-established
+        self._subscribe()
+        self._published_state = None
+        self._changed.set()
+
+    def _on_message(self, _client: Any, _userdata: Any, message: Any) -> None:
+        payload = message.payload
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8", errors="replace")
+        self._commands.put((message.topic, payload.strip().lower()))
+
+    def _apply(self, topic: str, payload: str) -> None:
+        if topic == self._topic("brightness/set"):
+            value = _parse_brightness(payload)
+            if value is None:
+                return
+            with self._backlight.fade(duration=self._fade_duration):
+                self._backlight.brightness = value
+        elif topic == self._topic("power/set"):
+            if payload == "toggle":
+                self._backlight.power = not self._backlight.power
+            elif payload in ("on", "off"):
+                self._backlight.power = payload == "on"
+            else:
+                return
+
+    def _coalesce(self, commands: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Keep only the latest valid brightness command and the combined power
+        commands, in the order they were last received.
+        """
+        latest: Dict[str, str] = {}
+        for topic, payload in commands:
+            if topic == self._topic("brightness/set"):
+                if _parse_brightness(payload) is None:
+                    continue
+                combined: Optional[str] = payload
+            elif topic == self._topic("power/set"):
+                combined = _combine_power(latest.get(topic), payload)
+            else:
+                continue
+            latest.pop(topic, None)
+            if combined is not None:
+                latest[topic] = combined
+        return list(latest.items())
+
+    def _process_commands(self) -> None:
+        while True:
+            # A slider sends many commands while a fade is applied, skip stale ones
+            commands = [self._commands.get()]
+            while commands[-1] is not None:
+                try:
+                    commands.append(self._commands.get_nowait())
+                except queue.Empty:
+                    break
+            stop = commands[-1] is None
+            for topic, payload in self._coalesce(
+                command for command in commands if command is not None
+            ):
+                self._applying.set()
+                # Publish the state while the command is applied, e.g. during a fade
+                self._changed.set()
+                try:
+                    self._apply(topic, payload)
+                except (OSError, ValueError):
+                    # Keep handling commands, the display may recover
+                    _LOGGER.exception("Failed to apply %s", topic)
+                finally:
+                    self._applying.clear()
+                    self._changed.set()
+            if stop:
+                return
+
+    def publish_state(self) -> bool:
+        """Publish the current state if it changed since the last publish, return
+        whether anything was published.
+        """
+        state = (int(self._backlight.brightness), self._backlight.power)
+        if state == self._published_state:
+            return False
+        previous = self._published_state
+        if previous is None or previous[0] != state[0]:
+            self._client.publish(
+                self._topic("brightness"), str(state[0]), qos=1, retain=True
+            )
+        if previous is None or previous[1] != state[1]:
+            self._client.publish(
+                self._topic("power"), "on" if state[1] else "off", qos=1, retain=True
+            )
+        self._published_state = state
+        self._last_publish = time.monotonic()
+        return True
+
+    def run(self, poll_interval: float = 5.0) -> None:
+        """Apply commands and publish state changes until
+        :meth:`~rpi_backlight.mqtt.MqttBridge.stop` is called.
+
+        The state is re-checked every ``poll_interval`` seconds even without commands
+        to pick up changes made by other programs.
+        """
+        worker = threading.Thread(target=self._process_commands, daemon=True)
+        worker.start()
+        self._changed.set()
+        while not self._stop_requested.is_set():
+            # Sample once per debounce interval while a command is being applied
+            if self._applying.is_set():
+                self._changed.wait(self._debounce)
+            else:
+                self._changed.wait(poll_interval)
+            # Sleep out the rest of the debounce interval, coalescing changes
+            remaining = self._last_publish + self._debounce - time.monotonic()
+            if remaining > 0 and self._stop_requested.wait(remaining):
+                break
+            self._changed.clear()
+            try:
+                self.publish_state()
+            except (OSError, ValueError):
+                _LOGGER.exception("Failed to publish state")
+        self._commands.put(None)
+        worker.join()
+        self._stop_requested.clear()
+
+    def stop(self) -> None:
+        """Stop :meth:`~rpi_backlight.mqtt.MqttBridge.run`, safe to call from another thread."""
+        self._stop_requested.set()
+        self._changed.set()
+
+
+def _create_argument_parser():
+    parser = ArgumentParser(
+        description="Control the display backlight power and brightness over MQTT."
+    )
+    parser.add_argument(
+        "sysfs_path",
+        metavar="SYSFS_PATH",
+        type=str,
+        nargs="?",
+        default=None,
+        help="Optional path to the backlight sysfs, set to :emulator: to use with rpi-backlight-emulator",
+    )
+    parser.add_argument(
+        "-H", "--host", default="localhost", help="MQTT broker host name"
+    )
+    parser.add_argument("-P", "--port", type=int, default=1883, help="MQTT broker port")
+    parser.add_argument("-u", "--username", help="MQTT broker user name")
+    parser.add_argument("--password", help="MQTT broker password")
+    parser.add_argument(
+        "-t", "--prefix", default="rpi-backlight", help="MQTT topic prefix"
+    )
+    parser.add_argument(
+        "-d", "--duration", type=float, default=0, help="fading duration in seconds"
+    )
+    parser.add_argument(
+        "--status-page",
+        metavar="PATH",
+        nargs="?",
+        const=str(DEFAULT_STATUS_PATH),
+        help=f"publish changes to a status page (default path: {DEFAULT_STATUS_PATH})",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.5,
+        help="minimum interval between state publishes in seconds",
+    )
+    parser.add_argument(
+        "-B",
+        "--board-type",
+        default=BOARD_TYPE_TO_STRING.get(utils.detect_board_type(), "raspberry-pi"),
+        choices=STRING_TO_BOARD_TYPE.keys(),
+        help="board type",
+    )
+    parser.add_argument(
+        "-V",
+        "--version",
+        action="version",
+        version=f"%(prog)s {__version__}",
+    )
+    return parser
+
+
+def main():
+    """Start the MQTT bridge."""
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        print("Please install paho-mqtt to use the rpi-backlight MQTT bridge!")
+        sys.exit()
+
+    parser = _create_argument_parser()
+    args = parser.parse_args()
+
+    status_page = None
+    if args.status_page:
+        try:
+            status_page = StatusPage(args.status_page)
+        except OSError as e:
+            parser.error(f"cannot open status page: {e}")
+
+    backlight = Backlight(
+        board_type=STRING_TO_BOARD_TYPE[args.board_type],
+        backlight_sysfs_path=args.sysfs_path,
+        status_page=status_page,
+    )
+
+    # paho-mqtt 2.x requires selecting the callback API version
+    if hasattr(mqtt, "CallbackAPIVersion"):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    else:
+        client = mqtt.Client()
+    if args.username:
+        client.username_pw_set(args.username, args.password)
+
+    bridge = MqttBridge(
+        backlight,
+        client,
+        prefix=args.prefix,
+        fade_duration=args.duration,
+        debounce=args.debounce,
+    )
+    client.connect(args.host, args.port)
+    client.loop_start()
+    try:
+        bridge.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
@@ -0,0 +1,180 @@
+import fcntl
+import mmap
+import os
+import struct
+import time
+from os import PathLike
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+__all__ = ["Status", "StatusPage", "StatusReader"]
+
+DEFAULT_STATUS_PATH = Path("/dev/shm/rpi-backlight.status")
+
+# Sequence counter, odd while a write is in progress
+_SEQUENCE = struct.Struct("<Q")
+# brightness (0-100, -1 if unknown), power (0/1, 255 if unknown), fading,
+# wall clock time of the last update
+_DATA = struct.Struct("<dBB6xd")
+_DATA_OFFSET = _SEQUENCE.size
+_SIZE = _DATA_OFFSET + _DATA.size
+_UNKNOWN_POWER = 255
+# Writes take microseconds, an odd sequence for longer means a writer crashed
+_MAX_READ_ATTEMPTS = 100_000
+# Group-writable, so processes of different users in the file's group can publish
+_MODE = 0o664
+
+
+class Status(NamedTuple):
+    """A consistent snapshot of a status page."""
+
+    #: Display brightness in range 0-100, None if not published yet
+    brightness: Optional[float]
+    #: Display power, None if not published yet
+    power: Optional[bool]
+    #: Whether a brightness fade is in progress
+    fading: bool
+    #: Wall clock time of the last update, 0 if never updated
+    updated: float
+    #: Sequence counter, incremented by two on every update
+    sequence: int
+
+
+def _open_mapping(path: Union[str, "PathLike[str]"], writable: bool) -> mmap.mmap:
+    if writable:
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, _MODE)
+            # The mode passed to open() is subject to the umask
+            os.fchmod(fd, _MODE)
+        except FileExistsError:
+            fd = os.open(path, os.O_RDWR)
+    else:
+        fd = os.open(path, os.O_RDONLY)
+    try:
+        if writable and os.fstat(fd).st_size < _SIZE:
+            os.ftruncate(fd, _SIZE)
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        return mmap.mmap(fd, _SIZE, access=access)
+    finally:
+        # The mapping stays valid after closing the file descriptor
+        os.close(fd)
+
+
+class StatusPage:
+    """Publish brightness, power and fade state to a small memory-mapped file,
+    ``/dev/shm/rpi-backlight.status`` by default.
+
+    Pass it to :class:`~rpi_backlight.Backlight` to update it on every write. Several
+    processes can publish to the same page; updates are serialized with
+    :func:`fcntl.flock` and protected by a sequence counter so
+    :class:`~rpi_backlight.status.StatusReader` never sees a torn record.
+
+    The file is created group-writable (``0664``). To let users other than the one that
+    created it publish, e.g. the CLI run by a user while a root service created the
+    page, change its group to one they share, e.g. with
+    ``chgrp video /dev/shm/rpi-backlight.status``.
+
+    >>> backlight = Backlight(status_page=StatusPage())
+    """
+
+    def __init__(self, path: Union[str, "PathLike[str]"] = DEFAULT_STATUS_PATH):
+        self.path = Path(path)
+        self._map = _open_mapping(self.path, writable=True)
+        self._lock_fd = os.open(self.path, os.O_RDONLY)
+
+    def update(
+        self,
+        brightness: Optional[float] = None,
+        power: Optional[bool] = None,
+        fading: Optional[bool] = None,
+    ) -> None:
+        """Update the given fields, keep the others."""
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            (sequence,) = _SEQUENCE.unpack_from(self._map, 0)
+            old_brightness, old_power, old_fading, _ = _DATA.unpack_from(
+                self._map, _DATA_OFFSET
+            )
+            if sequence == 0:
+                # Never written, fields not passed here are unknown
+                old_brightness, old_power = -1.0, _UNKNOWN_POWER
+            # A crashed writer may have left the counter odd
+            sequence |= 1
+            _SEQUENCE.pack_into(self._map, 0, sequence)
+            _DATA.pack_into(
+                self._map,
+                _DATA_OFFSET,
+                old_brightness if brightness is None else brightness,
+                old_power if power is None else int(power),
+                old_fading if fading is None else int(fading),
+                time.time(),
+            )
+            _SEQUENCE.pack_into(self._map, 0, sequence + 1)
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        """Unmap the status page, the file is kept for readers."""
+        self._map.close()
+        os.close(self._lock_fd)
+
+    def __enter__(self) -> "StatusPage":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+class StatusReader:
+    """Read a status page published by :class:`~rpi_backlight.status.StatusPage`.
+
+    The page is mapped once, after that :meth:`~rpi_backlight.status.StatusReader.read`
+    only reads memory and does not make any system calls.
+
+    >>> reader = StatusReader()
+    >>> reader.read().brightness
+    50.0
+    """
+
+    def __init__(self, path: Union[str, "PathLike[str]"] = DEFAULT_STATUS_PATH):
+        self.path = Path(path)
+        self._map = _open_mapping(self.path, writable=False)
+
+    def read(self) -> Status:
+        """Return a consistent snapshot of the status page.
+
+        Raises :class:`RuntimeError` if no consistent snapshot can be read, e.g.
+        because a writer was killed in the middle of an update. The page recovers
+        with the next update by any :class:`~rpi_backlight.status.StatusPage`.
+        """
+        for _ in range(_MAX_READ_ATTEMPTS):
+            (sequence,) = _SEQUENCE.unpack_from(self._map, 0)
+            if sequence & 1:
+                # Write in progress
+                continue
+            brightness, power, fading, updated = _DATA.unpack_from(
+                self._map, _DATA_OFFSET
+            )
+            if _SEQUENCE.unpack_from(self._map, 0)[0] == sequence:
+                break
+        else:
+            raise RuntimeError(
+                f"Status page {self.path} is not consistent, a writer may have crashed"
+            )
+        return Status(
+            brightness=None if sequence == 0 or brightness < 0 else brightness,
+            power=None if sequence == 0 or power == _UNKNOWN_POWER else bool(power),
+            fading=bool(fading),
+            updated=updated,
+            sequence=sequence,
+        )
+
+    def close(self) -> None:
+        """Unmap the status page."""
+        self._map.close()
+
+    def __enter__(self) -> "StatusReader":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
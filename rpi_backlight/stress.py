@@ -0,0 +1,315 @@
+import multiprocessing
+import random
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from os import PathLike
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Union
+
+from . import Backlight, BoardType, __version__
+from .utils import FakeBacklightSysfs, percentile
+
+__all__ = ["StressResult", "run_stress"]
+
+
+class _Write(NamedTuple):
+    # time.monotonic() is system-wide, so these compare across processes
+    start: float
+    end: float
+    value: int
+
+
+class _WorkerResult(NamedTuple):
+    start: float
+    end: float
+    latencies: List[float]
+    retries: int
+    torn_writes: int
+    violations: List[str]
+    errors: List[str]
+    # Last successful write of each worker per sysfs file
+    last_writes: Dict[str, _Write]
+
+
+class StressResult(NamedTuple):
+    """Result of :func:`~rpi_backlight.stress.run_stress`."""
+
+    #: Number of operations run by all workers
+    ops: int
+    #: Duration from the first worker starting to the last one finishing in seconds
+    duration: float
+    #: Operations per second over all workers
+    ops_per_sec: float
+    #: Latency percentiles (``p50``, ``p95``, ``p99``, ``max``) in seconds
+    latency: Dict[str, float]
+    #: Reads that hit the retry path in ``Backlight._get_value``
+    retries: int
+    #: Reads of values mixed from two overlapping writes. Regular files of a
+    #: :class:`~rpi_backlight.utils.FakeBacklightSysfs` are truncated and written in
+    #: two steps, real sysfs attribute stores are atomic, so these are not violations.
+    torn_writes: int
+    #: Descriptions of reads returning values that were never written, and of final
+    #: values that don't match the last write to finish (lost updates)
+    violations: List[str]
+    #: Descriptions of unexpected exceptions
+    errors: List[str]
+
+
+def _allowed_raw_brightness(backlight: Backlight) -> Set[int]:
+    values = {backlight._denormalize_brightness(value) for value in range(101)}
+    # FakeBacklightSysfs starts at max_brightness
+    values.add(backlight._max_brightness)
+    return values
+
+
+def _torn_raw_brightness(allowed: Set[int]) -> Set[int]:
+    """Return values that a shorter write overwriting the start of a longer one can
+    leave in a regular file, e.g. "5" written over "128" gives "528".
+    """
+    torn = set()
+    for short in map(str, allowed):
+        for long in map(str, allowed):
+            if len(short) < len(long):
+                torn.add(int(short + long[len(short) :]))
+    return torn - allowed
+
+
+def _final_value_candidates(writes: Sequence[_Write]) -> Set[int]:
+    """Return the values the file may hold after ``writes``, the last write of each
+    worker. Any write that ended after the last write started may have won the race.
+    """
+    last_start = max(write.start for write in writes)
+    return {write.value for write in writes if write.end >= last_start}
+
+
+def _worker(sysfs_path: str, ops: int, seed: int) -> _WorkerResult:
+    """Run a random mix of reads and writes, run in a thread or a child process."""
+    rng = random.Random(seed)
+    backlight = Backlight(
+        backlight_sysfs_path=sysfs_path, board_type=BoardType.RASPBERRY_PI
+    )
+    allowed_brightness = _allowed_raw_brightness(backlight)
+    torn_brightness = _torn_raw_brightness(allowed_brightness)
+
+    latencies: List[float] = []
+    violations: List[str] = []
+    errors: List[str] = []
+    torn_writes = 0
+    last_writes: Dict[str, _Write] = {}
+    worker_start = time.monotonic()
+    for _ in range(ops):
+        op = rng.randrange(4)
+        start = time.perf_counter()
+        try:
+            if op == 0:
+                brightness = rng.randint(0, 100)
+                write_start = time.monotonic()
+                backlight.brightness = brightness
+                last_writes["brightness"] = _Write(
+                    write_start,
+                    time.monotonic(),
+                    backlight._denormalize_brightness(brightness),
+                )
+            elif op == 1:
+                power = rng.random() < 0.5
+                write_start = time.monotonic()
+                backlight.power = power
+                last_writes["bl_power"] = _Write(
+                    write_start, time.monotonic(), int(not power)
+                )
+            elif op == 2:
+                value = backlight._get_value("actual_brightness")
+                if value in torn_brightness:
+                    torn_writes += 1
+                elif value not in allowed_brightness:
+                    violations.append(f"read brightness {value}")
+            else:
+                value = backlight._get_value("bl_power")
+                if value not in (0, 1):
+                    violations.append(f"read bl_power {value}")
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+        latencies.append(time.perf_counter() - start)
+    return _WorkerResult(
+        worker_start,
+        time.monotonic(),
+        latencies,
+        backlight._read_retries,
+        torn_writes,
+        violations,
+        errors,
+        last_writes,
+    )
+
+
+def run_stress(
+    sysfs_path: Union[str, "PathLike[str]"],
+    threads: int = 4,
+    processes: int = 2,
+    ops: int = 1000,
+    seed: Optional[int] = None,
+) -> StressResult:
+    """Run ``threads`` threads and ``processes`` processes concurrently against the
+    backlight sysfs at ``sysfs_path``, each doing ``ops`` random reads and writes.
+
+    Use a :class:`~rpi_backlight.utils.FakeBacklightSysfs`, the display will flicker
+    on real hardware.
+    """
+    if threads < 0 or processes < 0 or threads + processes == 0:
+        raise ValueError("at least one thread or process worker is required")
+    if seed is None:
+        seed = random.randrange(2**32)
+
+    sysfs_path = str(sysfs_path)
+    futures: List["Future[_WorkerResult]"] = []
+    # Forking a process that already runs worker threads can deadlock
+    with ThreadPoolExecutor(max(threads, 1)) as thread_pool, ProcessPoolExecutor(
+        max(processes, 1), mp_context=multiprocessing.get_context("spawn")
+    ) as process_pool:
+        for i in range(threads):
+            futures.append(thread_pool.submit(_worker, sysfs_path, ops, seed + i))
+        for i in range(processes):
+            futures.append(
+                process_pool.submit(_worker, sysfs_path, ops, seed + threads + i)
+            )
+        results = [future.result() for future in futures]
+    # Don't count the time it takes to spawn the processes
+    duration = max(result.end for result in results) - min(
+        result.start for result in results
+    )
+
+    latencies = [latency for result in results for latency in result.latencies]
+    violations = [violation for result in results for violation in result.violations]
+    torn_writes = sum(result.torn_writes for result in results)
+    # Check for lost or mixed up writes in the final state
+    backlight = Backlight(
+        backlight_sysfs_path=sysfs_path, board_type=BoardType.RASPBERRY_PI
+    )
+    for name in ("brightness", "bl_power"):
+        writes = [
+            result.last_writes[name] for result in results if name in result.last_writes
+        ]
+        if not writes:
+            continue
+        candidates = _final_value_candidates(writes)
+        final_value = backlight._get_value(name)
+        if final_value in _torn_raw_brightness(candidates):
+            torn_writes += 1
+        elif final_value not in candidates:
+            violations.append(
+                f"final {name} {final_value}, last written {sorted(candidates)}"
+            )
+
+    return StressResult(
+        ops=len(latencies),
+        duration=duration,
+        ops_per_sec=len(latencies) / duration,
+        latency={
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies),
+        },
+        retries=sum(result.retries for result in results),
+        torn_writes=torn_writes,
+        violations=violations,
+        errors=[error for result in results for error in result.errors],
+    )
+
+
+def _create_argument_parser():
+    parser = ArgumentParser(
+        description="Stress test Backlight with concurrent threads and processes against a fake sysfs."
+    )
+    parser.add_argument(
+        "-t", "--threads", type=int, default=4, help="number of thread workers"
+    )
+    parser.add_argument(
+        "-p", "--processes", type=int, default=2, help="number of process workers"
+    )
+    parser.add_argument(
+        "-n", "--ops", type=int, default=1000, help="operations per worker"
+    )
+    parser.add_argument("--seed", type=int, help="random seed")
+    parser.add_argument(
+        "--min-ops-per-sec",
+        type=float,
+        help="fail if the throughput is lower than this",
+    )
+    parser.add_argument(
+        "--max-p99-latency",
+        type=float,
+        help="fail if the 99th percentile latency in milliseconds is higher than this",
+    )
+    parser.add_argument(
+        "--max-violations",
+        type=int,
+        help="fail if there are more consistency violations than this",
+    )
+    parser.add_argument(
+        "--max-errors",
+        type=int,
+        help="fail if there are more unexpected exceptions than this",
+    )
+    parser.add_argument(
+        "-V",
+        "--version",
+        action="version",
+        version=f"%(prog)s {__version__}",
+    )
+    return parser
+
+
+def main():
+    """Start the stress test harness."""
+    parser = _create_argument_parser()
+    args = parser.parse_args()
+
+    with FakeBacklightSysfs() as backlight_sysfs:
+        try:
+            result = run_stress(
+                backlight_sysfs.path,
+                threads=args.threads,
+                processes=args.processes,
+                ops=args.ops,
+                seed=args.seed,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+
+    print(f"{result.ops} operations in {result.duration:.3f}s")
+    print(f"throughput: {result.ops_per_sec:.1f} ops/s")
+    print(
+        "latency: "
+        + ", ".join(f"{k} {v * 1000:.3f}ms" for k, v in result.latency.items())
+    )
+    print(f"read retries: {result.retries}")
+    print(f"torn writes (fake sysfs only): {result.torn_writes}")
+    print(f"consistency violations: {len(result.violations)}")
+    for violation in result.violations[:10]:
+        print(f"  {violation}")
+    print(f"errors: {len(result.errors)}")
+    for error in result.errors[:10]:
+        print(f"  {error}")
+
+    failures = []
+    if args.min_ops_per_sec is not None and result.ops_per_sec < args.min_ops_per_sec:
+        failures.append(f"throughput below {args.min_ops_per_sec} ops/s")
+    if (
+        args.max_p99_latency is not None
+        and result.latency["p99"] * 1000 > args.max_p99_latency
+    ):
+        failures.append(f"p99 latency above {args.max_p99_latency}ms")
+    if args.max_violations is not None and len(result.violations) > args.max_violations:
+        failures.append(f"more than {args.max_violations} consistency violations")
+    if args.max_errors is not None and len(result.errors) > args.max_errors:
+        failures.append(f"more than {args.max_errors} errors")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
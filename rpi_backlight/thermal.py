@@ -0,0 +1,217 @@
+import threading
+import time
+from glob import iglob
+from os import PathLike
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Union
+
+from . import Backlight
+
+__all__ = ["ThermalGovernor"]
+
+_DEFAULT_THERMAL_ZONES = "/sys/class/thermal/thermal_zone*/temp"
+# Battery capacity (in percent) must rise this much above low_capacity to lift the cap
+_CAPACITY_HYSTERESIS = 5.0
+
+
+class ThermalGovernor:
+    """Limit the display brightness based on temperature and battery capacity.
+
+    The ceiling is 100 up to ``throttle_temp`` (in °C) and drops linearly to
+    ``min_ceiling`` at ``critical_temp``, using the hottest of the ``zones``
+    (``/sys/class/thermal/thermal_zone*/temp`` by default). If ``capacity_path``
+    (e.g. ``/sys/class/power_supply/BAT0/capacity``) is given and reads below
+    ``low_capacity``, the ceiling is at most ``low_capacity_ceiling``.
+
+    The temperature has to drop by ``hysteresis`` before the ceiling is raised again,
+    and the ceiling moves at most ``ramp_rate`` percent per second, so changes are
+    hardly visible. Temperatures are sampled every ``min_interval`` seconds while
+    throttling, backing off to ``max_interval`` while cool and stable.
+
+    Pass it to :class:`~rpi_backlight.Backlight` to cap every brightness change:
+
+    >>> governor = ThermalGovernor(throttle_temp=55, critical_temp=75)
+    >>> backlight = Backlight(governor=governor)
+    >>> backlight.brightness = 100  # Set to at most governor.ceiling()
+    """
+
+    def __init__(
+        self,
+        zones: Optional[Iterable[Union[str, "PathLike[str]"]]] = None,
+        capacity_path: Optional[Union[str, "PathLike[str]"]] = None,
+        throttle_temp: float = 60.0,
+        critical_temp: float = 80.0,
+        min_ceiling: float = 20.0,
+        hysteresis: float = 3.0,
+        ramp_rate: float = 5.0,
+        low_capacity: float = 20.0,
+        low_capacity_ceiling: float = 50.0,
+        min_interval: float = 1.0,
+        max_interval: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if critical_temp <= throttle_temp:
+            raise ValueError(
+                f"critical_temp must be > throttle_temp, got {critical_temp} <= {throttle_temp}"
+            )
+        for name, value in (
+            ("min_ceiling", min_ceiling),
+            ("low_capacity_ceiling", low_capacity_ceiling),
+        ):
+            if value < 0 or value > 100:
+                raise ValueError(f"{name} must be in range 0-100, got {value}")
+        if ramp_rate <= 0:
+            raise ValueError(f"ramp_rate must be > 0, got {ramp_rate}")
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError(
+                f"intervals must satisfy 0 < min_interval <= max_interval, "
+                f"got {min_interval}, {max_interval}"
+            )
+
+        if zones is None:
+            zones = sorted(iglob(_DEFAULT_THERMAL_ZONES))
+        self._zones = [Path(zone) for zone in zones]
+        self._capacity_path = Path(capacity_path) if capacity_path else None
+        self._throttle_temp = throttle_temp
+        self._critical_temp = critical_temp
+        self._min_ceiling = min_ceiling
+        self._hysteresis = hysteresis
+        self._ramp_rate = ramp_rate
+        self._low_capacity = low_capacity
+        self._low_capacity_ceiling = low_capacity_ceiling
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._clock = clock
+
+        self._temperature: Optional[float] = None
+        self._low_battery = False
+        self._target = 100.0
+        self._ceiling = 100.0
+        self._interval = min_interval
+        self._last_update = clock()
+        self._next_sample = self._last_update
+        self._lock = threading.Lock()
+
+    @property
+    def temperature(self) -> Optional[float]:
+        """The temperature in °C the ceiling is based on, None if unknown."""
+        return self._temperature
+
+    @property
+    def interval(self) -> float:
+        """The current temperature sampling interval in seconds."""
+        return self._interval
+
+    def _read_temperature(self) -> Optional[float]:
+        temperatures: List[float] = []
+        for zone in self._zones:
+            try:
+                # Reported in millidegrees Celsius
+                temperatures.append(int(zone.read_text()) / 1000)
+            except (OSError, ValueError):
+                continue
+        return max(temperatures, default=None)
+
+    def _read_capacity(self) -> Optional[float]:
+        if self._capacity_path is None:
+            return None
+        try:
+            return float(self._capacity_path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _sample(self, now: float) -> None:
+        temperature = self._read_temperature()
+        previous = self._temperature
+        if temperature is None:
+            self._temperature = None
+        elif (
+            previous is None
+            or temperature > previous
+            or temperature < previous - self._hysteresis
+        ):
+            self._temperature = temperature
+
+        target = 100.0
+        if self._temperature is not None and self._temperature > self._throttle_temp:
+            fraction = min(
+                1.0,
+                (self._temperature - self._throttle_temp)
+                / (self._critical_temp - self._throttle_temp),
+            )
+            target = 100.0 - fraction * (100.0 - self._min_ceiling)
+
+        capacity = self._read_capacity()
+        if capacity is not None:
+            if capacity < self._low_capacity:
+                self._low_battery = True
+            elif capacity >= self._low_capacity + _CAPACITY_HYSTERESIS:
+                self._low_battery = False
+        if self._low_battery:
+            target = min(target, self._low_capacity_ceiling)
+        self._target = target
+
+        # Sample often while throttling or when the temperature moves fast,
+        # back off while everything is cool and stable
+        if (
+            target < 100.0
+            or self._ceiling != target
+            or (
+                temperature is not None
+                and (
+                    temperature >= self._throttle_temp - self._hysteresis
+                    or (
+                        previous is not None
+                        and abs(temperature - previous) >= self._hysteresis
+                    )
+                )
+            )
+        ):
+            self._interval = self._min_interval
+        else:
+            self._interval = min(self._interval * 2, self._max_interval)
+        self._next_sample = now + self._interval
+
+    def ceiling(self) -> float:
+        """Return the current maximum brightness in range 0-100.
+
+        Temperatures are only read when the sampling interval has elapsed, so this is
+        cheap to call on every brightness change.
+        """
+        with self._lock:
+            now = self._clock()
+            if now >= self._next_sample:
+                self._sample(now)
+            max_step = self._ramp_rate * (now - self._last_update)
+            self._last_update = now
+            if self._ceiling > self._target:
+                self._ceiling = max(self._target, self._ceiling - max_step)
+            else:
+                self._ceiling = min(self._target, self._ceiling + max_step)
+            return self._ceiling
+
+    def enforce(self, backlight: Backlight) -> None:
+        """Lower the brightness of ``backlight`` if it is above the ceiling, and raise
+        it back to the brightness last set on ``backlight`` as the ceiling rises.
+        """
+        ceiling = self.ceiling()
+        current = backlight.brightness
+        requested = backlight._requested_brightness
+        if requested is None or current != backlight._written_brightness:
+            # Not set yet or changed by someone else, e.g. the CLI
+            requested = backlight._requested_brightness = current
+        target = min(requested, ceiling)
+        if (
+            backlight._normalize_brightness(backlight._denormalize_brightness(target))
+            != current
+        ):
+            # Don't use fade(), it would change fade_duration for other threads
+            backlight._write_brightness(target)
+
+    def run(self, backlight: Backlight, stop: threading.Event) -> None:
+        """Call :meth:`~rpi_backlight.thermal.ThermalGovernor.enforce` at the sampling
+        interval until ``stop`` is set.
+        """
+        while not stop.is_set():
+            self.enforce(backlight)
+            stop.wait(self._interval)
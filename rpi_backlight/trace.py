@@ -0,0 +1,387 @@
+import atexit
+import errno
+import struct
+import threading
+import time
+from argparse import ArgumentParser
+from os import PathLike
+from pathlib import Path
+from statistics import mean, pstdev
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from . import Backlight, __version__
+from .utils import FakeBacklightSysfs, percentile
+
+__all__ = ["Tracer", "TraceRecord", "load_trace", "replay_trace", "summarize_trace"]
+
+_MAGIC = b"RPBT"
+_VERSION = 1
+# magic, version, wall clock time the tracer was created, record count, name count
+_HEADER = struct.Struct("<4sBdIB")
+# timestamp (s, relative), operation, file index, value, latency (us), errno
+_RECORD = struct.Struct("<dBBiIH")
+_OP_READ = 0
+_OP_WRITE = 1
+# Consecutive brightness writes closer than this are considered one fade
+_FADE_GAP = 0.25
+
+
+def _error_code(error: Exception) -> int:
+    """Return the ``errno`` to record for a failed operation, never 0."""
+    if isinstance(error, OSError):
+        if error.errno:
+            return error.errno
+        # Backlight raises a PermissionError without errno from the original error
+        if isinstance(error.__context__, OSError) and error.__context__.errno:
+            return error.__context__.errno
+        if isinstance(error, PermissionError):
+            return errno.EPERM
+        return errno.EIO
+    # File content that is not a number
+    return errno.EINVAL
+
+
+class TraceRecord(NamedTuple):
+    """A single recorded sysfs operation."""
+
+    #: Seconds since the tracer was created
+    timestamp: float
+    #: ``"read"`` or ``"write"``
+    op: str
+    #: sysfs file name, e.g. ``"brightness"``
+    file: str
+    #: Value read or written, -1 for failed reads
+    value: int
+    #: Duration of the operation in seconds
+    latency: float
+    #: ``errno`` of a failed operation, 0 on success
+    errno: int
+
+
+class Tracer:
+    """Record every sysfs operation of one or more :class:`~rpi_backlight.Backlight`
+    instances into a fixed-size binary ring buffer.
+
+    Only the last ``capacity`` operations are kept, so memory use is bounded no
+    matter how long the tracer runs.
+
+    >>> tracer = Tracer()
+    >>> backlight = Backlight()
+    >>> tracer.attach(backlight)
+    >>> tracer.dump_on_exit("/tmp/rpi-backlight.trace")
+    >>> with backlight.fade(duration=1):
+    ...     backlight.brightness = 0
+    """
+
+    def __init__(self, capacity: int = 4096):
+        if capacity < 1:
+            raise ValueError(f"capacity must be >= 1, got {capacity}")
+        self._capacity = capacity
+        self._buffer = bytearray(capacity * _RECORD.size)
+        self._next = 0
+        self._count = 0
+        self._names: List[str] = []
+        self._start = time.monotonic()
+        self._start_wall = time.time()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _name_index(self, name: str) -> int:
+        try:
+            return self._names.index(name)
+        except ValueError:
+            self._names.append(name)
+            return len(self._names) - 1
+
+    def _record(
+        self, start: float, end: float, op: int, name: str, value: int, error: int
+    ) -> None:
+        with self._lock:
+            _RECORD.pack_into(
+                self._buffer,
+                self._next * _RECORD.size,
+                start - self._start,
+                op,
+                self._name_index(name),
+                value,
+                min(int((end - start) * 1_000_000), 0xFFFFFFFF),
+                error,
+            )
+            self._next = (self._next + 1) % self._capacity
+            self._count = min(self._count + 1, self._capacity)
+
+    def attach(self, backlight: Backlight) -> None:
+        """Start recording the sysfs operations of ``backlight``."""
+        get_value = backlight._get_value
+        set_value = backlight._set_value
+
+        def traced_get_value(name: str) -> int:
+            start = time.monotonic()
+            try:
+                value = get_value(name)
+            except (OSError, ValueError) as e:
+                self._record(
+                    start, time.monotonic(), _OP_READ, name, -1, _error_code(e)
+                )
+                raise
+            self._record(start, time.monotonic(), _OP_READ, name, value, 0)
+            return value
+
+        def traced_set_value(name: str, value: int) -> None:
+            start = time.monotonic()
+            try:
+                set_value(name, value)
+            except OSError as e:
+                self._record(
+                    start, time.monotonic(), _OP_WRITE, name, value, _error_code(e)
+                )
+                raise
+            self._record(start, time.monotonic(), _OP_WRITE, name, value, 0)
+
+        backlight._get_value = traced_get_value  # type: ignore[assignment]
+        backlight._set_value = traced_set_value  # type: ignore[assignment]
+
+    def detach(self, backlight: Backlight) -> None:
+        """Stop recording the sysfs operations of ``backlight``."""
+        backlight.__dict__.pop("_get_value", None)
+        backlight.__dict__.pop("_set_value", None)
+
+    def records(self) -> List[TraceRecord]:
+        """Return the recorded operations, oldest first."""
+        with self._lock:
+            first = (self._next - self._count) % self._capacity
+            return [
+                _unpack_record(
+                    self._buffer,
+                    ((first + i) % self._capacity) * _RECORD.size,
+                    self._names,
+                )
+                for i in range(self._count)
+            ]
+
+    def dump(self, path: Union[str, "PathLike[str]"]) -> None:
+        """Write the recorded operations to ``path``."""
+        with self._lock:
+            first = (self._next - self._count) % self._capacity
+            end = first + self._count
+            if end <= self._capacity:
+                records = self._buffer[first * _RECORD.size : end * _RECORD.size]
+            else:
+                records = (
+                    self._buffer[first * _RECORD.size :]
+                    + self._buffer[: (end - self._capacity) * _RECORD.size]
+                )
+            names = list(self._names)
+            header = _HEADER.pack(
+                _MAGIC, _VERSION, self._start_wall, self._count, len(names)
+            )
+        name_table = b"".join(
+            struct.pack("B", len(encoded)) + encoded
+            for encoded in (name.encode() for name in names)
+        )
+        Path(path).write_bytes(header + name_table + records)
+
+    def dump_on_exit(self, path: Union[str, "PathLike[str]"]) -> None:
+        """Write the recorded operations to ``path`` when the interpreter exits."""
+        atexit.register(self.dump, path)
+
+
+def _unpack_record(buffer: Any, offset: int, names: Sequence[str]) -> TraceRecord:
+    timestamp, op, index, value, latency, error = _RECORD.unpack_from(buffer, offset)
+    return TraceRecord(
+        timestamp,
+        "write" if op == _OP_WRITE else "read",
+        names[index],
+        value,
+        latency / 1_000_000,
+        error,
+    )
+
+
+def load_trace(path: Union[str, "PathLike[str]"]) -> Tuple[float, List[TraceRecord]]:
+    """Load a trace written by :meth:`~rpi_backlight.trace.Tracer.dump`, return the
+    wall clock start time and the records.
+    """
+    data = Path(path).read_bytes()
+    magic, version, start_wall, count, name_count = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"{path} is not a rpi-backlight trace file")
+    offset = _HEADER.size
+    names = []
+    for _ in range(name_count):
+        length = data[offset]
+        names.append(data[offset + 1 : offset + 1 + length].decode())
+        offset += 1 + length
+    records = [
+        _unpack_record(data, offset + i * _RECORD.size, names) for i in range(count)
+    ]
+    return start_wall, records
+
+
+def _latency_stats(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "mean": mean(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values),
+    }
+
+
+def _find_fades(records: Sequence[TraceRecord]) -> List[List[TraceRecord]]:
+    fades: List[List[TraceRecord]] = []
+    current: List[TraceRecord] = []
+    for record in records:
+        if record.op != "write" or record.file not in ("brightness", "tinker_mcu_bl"):
+            continue
+        if current and record.timestamp - current[-1].timestamp > _FADE_GAP:
+            fades.append(current)
+            current = []
+        current.append(record)
+    fades.append(current)
+    # A single write is a plain brightness change, not a fade
+    return [fade for fade in fades if len(fade) >= 3]
+
+
+def summarize_trace(records: Sequence[TraceRecord]) -> Dict[str, Any]:
+    """Compute operation counts, latency statistics, errors and per-fade timing
+    (achieved duration, step interval and step jitter) of a trace.
+    """
+    errors: Dict[int, int] = {}
+    for record in records:
+        if record.errno:
+            errors[record.errno] = errors.get(record.errno, 0) + 1
+    fades = []
+    for fade in _find_fades(records):
+        intervals = [b.timestamp - a.timestamp for a, b in zip(fade, fade[1:])]
+        fades.append(
+            {
+                "start": fade[0].timestamp,
+                "steps": len(fade),
+                "duration": fade[-1].timestamp + fade[-1].latency - fade[0].timestamp,
+                "step_interval": mean(intervals),
+                "step_jitter": pstdev(intervals),
+            }
+        )
+    return {
+        "reads": sum(1 for record in records if record.op == "read"),
+        "writes": sum(1 for record in records if record.op == "write"),
+        "read_latency": _latency_stats(
+            [record.latency for record in records if record.op == "read"]
+        ),
+        "write_latency": _latency_stats(
+            [record.latency for record in records if record.op == "write"]
+        ),
+        "errors": errors,
+        "fades": fades,
+    }
+
+
+def replay_trace(records: Sequence[TraceRecord], speed: float = 1.0) -> Dict[str, Any]:
+    """Replay the successful operations of a trace against a
+    :class:`~rpi_backlight.utils.FakeBacklightSysfs` with the original timing, return
+    statistics about how closely the timing could be reproduced.
+    """
+    if speed <= 0:
+        raise ValueError(f"speed must be > 0, got {speed}")
+    replayed = []
+    lateness = []
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        tracer = Tracer(capacity=max(len(records), 1))
+        tracer.attach(backlight)
+        origin = records[0].timestamp if records else 0.0
+        start = time.monotonic()
+        for record in records:
+            if record.errno:
+                continue
+            target = start + (record.timestamp - origin) / speed
+            delay = target - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            lateness.append(time.monotonic() - target)
+            if record.op == "write":
+                backlight._set_value(record.file, record.value)
+            elif (backlight_sysfs.path / record.file).exists():
+                backlight._get_value(record.file)
+        replayed = tracer.records()
+    summary = summarize_trace(replayed)
+    summary["lateness"] = _latency_stats(lateness)
+    return summary
+
+
+def _format_latency(name: str, stats: Dict[str, float]) -> str:
+    if not stats:
+        return f"{name}: -"
+    return f"{name}: " + ", ".join(
+        f"{key} {value * 1000:.3f}ms" for key, value in stats.items()
+    )
+
+
+def _print_summary(summary: Dict[str, Any]) -> None:
+    print(f"  operations: {summary['reads']} reads, {summary['writes']} writes")
+    print("  " + _format_latency("read latency", summary["read_latency"]))
+    print("  " + _format_latency("write latency", summary["write_latency"]))
+    if summary["errors"]:
+        errors = ", ".join(f"errno {k}: {v}" for k, v in summary["errors"].items())
+        print(f"  errors: {errors}")
+    if "lateness" in summary:
+        print("  " + _format_latency("replay lateness", summary["lateness"]))
+    for fade in summary["fades"]:
+        print(
+            f"  fade at {fade['start']:.3f}s: {fade['steps']} steps in "
+            f"{fade['duration']:.3f}s, step interval {fade['step_interval'] * 1000:.3f}ms, "
+            f"jitter {fade['step_jitter'] * 1000:.3f}ms"
+        )
+
+
+def _create_argument_parser():
+    parser = ArgumentParser(
+        description="Show statistics of a rpi-backlight trace and replay it against a fake sysfs."
+    )
+    parser.add_argument(
+        "trace_file", metavar="TRACE_FILE", type=str, help="trace file to read"
+    )
+    parser.add_argument(
+        "-s",
+        "--speed",
+        type=float,
+        default=1.0,
+        help="replay speed factor, e.g. 2 to replay twice as fast",
+    )
+    parser.add_argument(
+        "--no-replay",
+        action="store_true",
+        help="only show statistics of the recorded trace",
+    )
+    parser.add_argument(
+        "-V",
+        "--version",
+        action="version",
+        version=f"%(prog)s {__version__}",
+    )
+    return parser
+
+
+def main():
+    """Start the trace replay tool."""
+    parser = _create_argument_parser()
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("-s/--speed must be > 0")
+
+    try:
+        start_wall, records = load_trace(args.trace_file)
+    except (OSError, ValueError, struct.error) as e:
+        parser.error(str(e))
+
+    print(
+        f"Recorded ({time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_wall))}):"
+    )
+    _print_summary(summarize_trace(records))
+    if not args.no_replay:
+        print(f"Replayed against fake sysfs (speed {args.speed}x):")
+        _print_summary(replay_trace(records, speed=args.speed))
@@ -1,11 +1,11 @@
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Optional, TYPE_CHECKING
+from typing import Optional, Sequence, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from __init__ import BoardType
 
-__all__ = ["detect_board_type", "FakeBacklightSysfs"]
+__all__ = ["detect_board_type", "FakeBacklightSysfs", "percentile"]
 
 
 def detect_board_type() -> Optional["BoardType"]:
@@ -39,6 +39,15 @@ def detect_board_type() -> Optional["BoardType"]:
         return None
 
 
+def percentile(values: Sequence[float], percent: float) -> float:
+    """Return the ``percent``-th percentile of ``values`` (nearest-rank method)."""
+    if not values:
+        raise ValueError("values must not be empty")
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[min(int(rank), len(ordered)) - 1]
+
+
 class FakeBacklightSysfs:
     """Context manager to create a temporary "fake sysfs" containing all relevant files.
     Used for tests and emulation.
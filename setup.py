@@ -40,10 +40,14 @@ setup(
         "Topic :: Software Development :: Libraries :: Python Modules",
     ],
     packages=["rpi_backlight"],
+    extras_require={"mqtt": ["paho-mqtt"]},
     entry_points={
         "console_scripts": [
             "rpi-backlight = rpi_backlight.cli:main",
             "rpi-backlight-gui = rpi_backlight.gui:main",
+            "rpi-backlight-mqtt = rpi_backlight.mqtt:main",
+            "rpi-backlight-trace = rpi_backlight.trace:main",
+            "rpi-backlight-stress = rpi_backlight.stress:main",
         ]
     },
 )
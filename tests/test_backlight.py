@@ -1,5 +1,10 @@
+import json
+import time
+from pathlib import Path
+
 import pytest
 
+import rpi_backlight
 from rpi_backlight import Backlight, _EMULATOR_SYSFS_TMP_FILE_PATH
 from rpi_backlight.utils import FakeBacklightSysfs
 
@@ -108,3 +113,145 @@ def test_fade() -> None:
             assert backlight.fade_duration == 0.5
 
         assert backlight.fade_duration == 0.1
+
+
+def test_calibrate(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        backlight.brightness = 50
+        assert backlight.profile is None
+
+        with pytest.raises(ValueError):
+            backlight.calibrate(samples=0)
+
+        profile = backlight.calibrate(samples=5)
+        assert backlight.profile == profile
+        assert profile["sysfs_path"] == str(backlight_sysfs.path.resolve())
+        assert profile["write_latency"] > 0
+        assert profile["read_latency"] > 0
+        assert profile["settle_time"] > 0
+        assert profile["max_step_rate"] > 0
+        # Brightness is restored
+        assert backlight.brightness == 50
+
+        # The profile is persisted per device
+        assert Backlight(backlight_sysfs_path=backlight_sysfs.path).profile == profile
+        with FakeBacklightSysfs() as other_sysfs:
+            assert Backlight(backlight_sysfs_path=other_sysfs.path).profile is None
+
+
+@pytest.mark.parametrize(
+    "max_step_rate",
+    [None, "fast", 0, -1, float("inf"), True],
+)
+def test_invalid_profile(monkeypatch, tmp_path, max_step_rate) -> None:
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        profile = backlight.calibrate(samples=2)
+        if max_step_rate is None:
+            del profile["max_step_rate"]
+        else:
+            profile["max_step_rate"] = max_step_rate
+        path = rpi_backlight._profile_path(backlight_sysfs.path)
+        assert path is not None
+        path.write_text(json.dumps(profile))
+
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        assert backlight.profile is None
+        with backlight.fade(duration=0.01):
+            backlight.brightness = 90
+        assert backlight.brightness == 90
+
+        # Not even a dict
+        path.write_text("[]")
+        assert Backlight(backlight_sysfs_path=backlight_sysfs.path).profile is None
+
+
+def test_calibrate_unwritable_cache(monkeypatch, tmp_path) -> None:
+    # Not a directory, so the profile can't be saved
+    cache = tmp_path / "cache"
+    cache.write_text("")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache))
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        profile = backlight.calibrate(samples=2)
+        assert backlight.profile == profile
+        assert Backlight(backlight_sysfs_path=backlight_sysfs.path).profile is None
+
+
+def test_calibrate_not_tracking(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(rpi_backlight, "_CALIBRATION_SETTLE_TIMEOUT", 0.01)
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        backlight.brightness = 50
+
+        backlight.power = False
+        with pytest.raises(RuntimeError):
+            backlight.calibrate(samples=5)
+        backlight.power = True
+
+        # actual_brightness doesn't follow brightness anymore
+        actual_brightness = backlight_sysfs.path / "actual_brightness"
+        actual_brightness.unlink()
+        actual_brightness.write_text("128")
+        with pytest.raises(RuntimeError):
+            backlight.calibrate(samples=5)
+        assert backlight.profile is None
+        assert list(tmp_path.iterdir()) == []
+        # Brightness is restored
+        assert backlight._get_value("brightness") == 128
+
+
+def test_no_home(monkeypatch) -> None:
+    monkeypatch.delenv("XDG_CACHE_HOME", raising=False)
+    monkeypatch.delenv("HOME", raising=False)
+
+    def no_home() -> Path:
+        raise RuntimeError("Could not determine home directory.")
+
+    monkeypatch.setattr(Path, "home", no_home)
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        assert backlight.profile is None
+        with backlight.fade(duration=0.01):
+            backlight.brightness = 90
+        assert backlight.brightness == 90
+
+        # Calibrating works, the profile just isn't saved
+        profile = backlight.calibrate(samples=2)
+        assert backlight.profile == profile
+        assert Backlight(backlight_sysfs_path=backlight_sysfs.path).profile is None
+
+
+def test_fade_step_rate(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        writes = []
+        set_value = backlight._set_value
+
+        def recording_set_value(name: str, value: int) -> None:
+            writes.append(value)
+            set_value(name, value)
+
+        monkeypatch.setattr(backlight, "_set_value", recording_set_value)
+
+        # Without a profile, fade in steps of one percent
+        with backlight.fade(duration=0.05):
+            backlight.brightness = 90
+        assert len(writes) == 10
+        assert backlight.brightness == 90
+
+        # A slow device only manages 100 steps per second
+        backlight._profile = {"max_step_rate": 100}
+        writes.clear()
+        start = time.monotonic()
+        with backlight.fade(duration=0.05):
+            backlight.brightness = 0
+        assert time.monotonic() - start < 0.1
+        assert len(writes) == 5
+        assert writes[-1] == 0
+        assert backlight.brightness == 0
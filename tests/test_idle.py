@@ -0,0 +1,134 @@
+import os
+import threading
+
+import pytest
+
+from rpi_backlight import Backlight, idle
+from rpi_backlight.idle import (
+    INPUT_EVENT_SIZE,
+    IdleDimmer,
+    IdleState,
+    pack_input_event,
+)
+from rpi_backlight.utils import FakeBacklightSysfs
+
+
+def test_pack_input_event() -> None:
+    assert len(pack_input_event(1, 30, 1)) == INPUT_EVENT_SIZE
+
+
+def test_constructor() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+
+        with pytest.raises(ValueError):
+            IdleDimmer(backlight, dim_after=-1, devices=[])
+
+        with pytest.raises(ValueError):
+            IdleDimmer(backlight, dim_after=10, off_after=5, devices=[])
+
+        with pytest.raises(ValueError):
+            IdleDimmer(backlight, dim_after=10, dim_brightness=101, devices=[])
+
+
+def test_dim_off_and_wake() -> None:
+    read_fd, write_fd = os.pipe()
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        backlight.brightness = 80
+
+        with IdleDimmer(
+            backlight,
+            dim_after=0.05,
+            off_after=0.1,
+            dim_brightness=20,
+            fade_duration=0,
+            devices=[read_fd],
+        ) as dimmer:
+            assert dimmer.state == IdleState.ACTIVE
+
+            dimmer.poll()
+            assert dimmer.state == IdleState.DIMMED
+            assert backlight.brightness == 20
+            assert backlight.power is True
+
+            dimmer.poll()
+            assert dimmer.state == IdleState.OFF
+            assert backlight.power is False
+
+            os.write(write_fd, pack_input_event(1, 30, 1))
+            dimmer.poll()
+            assert dimmer.state == IdleState.ACTIVE
+            assert backlight.power is True
+            assert backlight.brightness == 80
+
+            # Input before the timeout keeps the display active
+            os.write(write_fd, pack_input_event(2, 0, 5))
+            dimmer.poll(timeout=0)
+            assert dimmer.state == IdleState.ACTIVE
+
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+def test_run_stop() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+
+        with IdleDimmer(backlight, dim_after=60, devices=[]) as dimmer:
+            thread = threading.Thread(target=dimmer.run)
+            thread.start()
+            dimmer.stop()
+            thread.join(timeout=1)
+            assert not thread.is_alive()
+            assert dimmer.state == IdleState.ACTIVE
+
+
+def test_reopen_unplugged_device(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(idle, "_RESCAN_INTERVAL", 0)
+    device = tmp_path / "event0"
+    os.mkfifo(device)
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+
+        with IdleDimmer(
+            backlight, dim_after=0, fade_duration=0, devices=[str(device)]
+        ) as dimmer:
+            # Closing the only writer looks like the device being unplugged
+            writer = os.open(device, os.O_WRONLY)
+            os.write(writer, pack_input_event(1, 30, 1))
+            os.close(writer)
+            dimmer.poll(timeout=0)
+            dimmer.poll(timeout=0)
+            assert dimmer.state == IdleState.DIMMED
+
+            # The device is reopened and input wakes the display again
+            dimmer.poll(timeout=0)
+            writer = os.open(device, os.O_WRONLY | os.O_NONBLOCK)
+            os.write(writer, pack_input_event(1, 30, 1))
+            dimmer.poll(timeout=1)
+            assert dimmer.state == IdleState.ACTIVE
+            os.close(writer)
+
+
+def test_device_plugged_in_later(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(idle, "_DEFAULT_INPUT_DEVICES", str(tmp_path / "event*"))
+    monkeypatch.setattr(idle, "_RESCAN_INTERVAL", 0.05)
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+
+        # No input devices at all when the dimmer starts
+        with IdleDimmer(backlight, dim_after=0, fade_duration=0) as dimmer:
+            dimmer.poll(timeout=0)
+            assert dimmer.state == IdleState.DIMMED
+
+            device = tmp_path / "event0"
+            os.mkfifo(device)
+            # Doesn't block forever, the new device is picked up by the next rescan
+            dimmer.poll()
+            dimmer.poll()
+            writer = os.open(device, os.O_WRONLY | os.O_NONBLOCK)
+            os.write(writer, pack_input_event(1, 30, 1))
+            dimmer.poll(timeout=1)
+            assert dimmer.state == IdleState.ACTIVE
+            os.close(writer)
@@ -1,5 +1,9 @@
+import time
+from pathlib import Path
+from typing import List
+
 import pytest
-from rpi_backlight import Backlight, _permission_denied
+from rpi_backlight import Backlight, _READ_RETRIES, _permission_denied
 from rpi_backlight.utils import FakeBacklightSysfs
 
 
@@ -15,6 +19,31 @@ def test_get_value() -> None:
         assert backlight._get_value("brightness") == 255
 
 
+def test_get_value_retry(monkeypatch) -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        sleeps: List[float] = []
+        monkeypatch.setattr(time, "sleep", sleeps.append)
+
+        # Empty reads while the file is being updated are retried
+        read_text = Path.read_text
+        responses = [""] * _READ_RETRIES
+
+        def flaky_read_text(self, *args, **kwargs):
+            return responses.pop() if responses else read_text(self, *args, **kwargs)
+
+        monkeypatch.setattr(Path, "read_text", flaky_read_text)
+        assert backlight._get_value("brightness") == 255
+        assert backlight._read_retries == _READ_RETRIES
+        assert len(sleeps) == _READ_RETRIES
+
+        # Invalid content fails after a bounded number of retries
+        (backlight_sysfs.path / "brightness").write_text("foo")
+        with pytest.raises(ValueError):
+            backlight._get_value("brightness")
+        assert backlight._read_retries == 2 * _READ_RETRIES
+
+
 def test_set_value() -> None:
     with FakeBacklightSysfs() as backlight_sysfs:
         backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
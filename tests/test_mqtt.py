@@ -0,0 +1,201 @@
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from rpi_backlight import Backlight
+from rpi_backlight.mqtt import MqttBridge
+from rpi_backlight.utils import FakeBacklightSysfs
+
+
+class FakeBroker:
+    """Stand-in for a connected paho-mqtt client and the broker behind it."""
+
+    def __init__(self) -> None:
+        self.subscriptions: List[str] = []
+        self.published: List[Tuple[str, str]] = []
+        self.retained: Dict[str, str] = {}
+        self.on_connect: Any = None
+        self.on_message: Any = None
+
+    def subscribe(self, topic: str) -> None:
+        self.subscriptions.append(topic)
+
+    def publish(self, topic: str, payload: str, qos: int = 0, retain: bool = False):
+        self.published.append((topic, payload))
+        if retain:
+            self.retained[topic] = payload
+
+    def deliver(self, topic: str, payload: str) -> None:
+        message = SimpleNamespace(topic=topic, payload=payload.encode())
+        self.on_message(self, None, message)
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_constructor() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        broker = FakeBroker()
+
+        with pytest.raises(ValueError):
+            MqttBridge(backlight, broker, debounce=0)
+
+        MqttBridge(backlight, broker, prefix="kiosk/")
+        assert broker.subscriptions == ["kiosk/brightness/set", "kiosk/power/set"]
+
+
+def test_publish_state() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        broker = FakeBroker()
+        bridge = MqttBridge(backlight, broker)
+
+        assert bridge.publish_state() is True
+        assert broker.retained == {
+            "rpi-backlight/brightness": "100",
+            "rpi-backlight/power": "on",
+        }
+        assert bridge.publish_state() is False
+
+        backlight.brightness = 50
+        assert bridge.publish_state() is True
+        # Only the changed value is published
+        assert broker.published[-1] == ("rpi-backlight/brightness", "50")
+        assert len(broker.published) == 3
+
+
+def test_commands_and_debounced_fade() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        broker = FakeBroker()
+        bridge = MqttBridge(backlight, broker, fade_duration=0.5, debounce=0.1)
+        thread = threading.Thread(target=bridge.run)
+        thread.start()
+        try:
+            assert wait_for(lambda: "rpi-backlight/power" in broker.retained)
+
+            broker.deliver("rpi-backlight/brightness/set", "0")
+            assert wait_for(
+                lambda: broker.retained.get("rpi-backlight/brightness") == "0"
+            )
+            brightness_messages = [
+                payload
+                for topic, payload in broker.published
+                if topic == "rpi-backlight/brightness"
+            ]
+            # 0.5s fade sampled every 0.1s, plus initial and final state
+            assert len(brightness_messages) <= 10
+
+            broker.deliver("rpi-backlight/power/set", "off")
+            assert wait_for(lambda: broker.retained["rpi-backlight/power"] == "off")
+            assert backlight.power is False
+
+            broker.deliver("rpi-backlight/power/set", "toggle")
+            assert wait_for(lambda: broker.retained["rpi-backlight/power"] == "on")
+
+            # Invalid commands are ignored
+            broker.deliver("rpi-backlight/brightness/set", "foo")
+            broker.deliver("rpi-backlight/brightness/set", "101")
+            broker.deliver("rpi-backlight/power/set", "maybe")
+        finally:
+            bridge.stop()
+            thread.join(timeout=2)
+        assert not thread.is_alive()
+        assert backlight.brightness == 0
+        assert backlight.power is True
+
+
+def test_errors_dont_stop_bridge() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        broker = FakeBroker()
+        bridge = MqttBridge(backlight, broker, debounce=0.01)
+        thread = threading.Thread(target=bridge.run, kwargs={"poll_interval": 0.05})
+        thread.start()
+        try:
+            assert wait_for(lambda: "rpi-backlight/power" in broker.retained)
+
+            # Reading and writing bl_power fails from now on
+            bl_power = backlight_sysfs.path / "bl_power"
+            bl_power.unlink()
+            bl_power.mkdir()
+            broker.deliver("rpi-backlight/power/set", "off")
+            broker.deliver("rpi-backlight/brightness/set", "10")
+            assert wait_for(lambda: backlight.brightness == 10)
+
+            # Publishing resumes once the display recovers
+            bl_power.rmdir()
+            bl_power.write_text("0")
+            assert wait_for(
+                lambda: broker.retained.get("rpi-backlight/brightness") == "10"
+            )
+        finally:
+            bridge.stop()
+            thread.join(timeout=2)
+        assert not thread.is_alive()
+
+
+def test_coalesce() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        bridge = MqttBridge(backlight, FakeBroker())
+        brightness = "rpi-backlight/brightness/set"
+        power = "rpi-backlight/power/set"
+
+        assert bridge._coalesce(
+            [
+                (brightness, "10"),
+                (power, "off"),
+                (brightness, "20"),
+                (brightness, "foo"),
+            ]
+        ) == [(power, "off"), (brightness, "20")]
+        assert bridge._coalesce([(power, "off"), (power, "toggle")]) == [(power, "on")]
+        assert bridge._coalesce([(power, "toggle"), (power, "toggle")]) == []
+        assert bridge._coalesce([(power, "toggle"), (power, "maybe")]) == [
+            (power, "toggle")
+        ]
+        assert bridge._coalesce([("other", "1")]) == []
+
+
+def test_slider_commands_coalesced() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        broker = FakeBroker()
+        bridge = MqttBridge(backlight, broker, fade_duration=0.2, debounce=0.05)
+        applied = []
+        apply = bridge._apply
+
+        def recording_apply(topic: str, payload: str) -> None:
+            applied.append(payload)
+            apply(topic, payload)
+
+        bridge._apply = recording_apply  # type: ignore[assignment]
+        thread = threading.Thread(target=bridge.run)
+        thread.start()
+        try:
+            # A slider dragged while the first fade is still running
+            broker.deliver("rpi-backlight/brightness/set", "0")
+            assert wait_for(lambda: applied == ["0"])
+            for value in range(10, 60):
+                broker.deliver("rpi-backlight/brightness/set", str(value))
+            assert wait_for(
+                lambda: broker.retained.get("rpi-backlight/brightness") == "59"
+            )
+        finally:
+            bridge.stop()
+            thread.join(timeout=2)
+        assert not thread.is_alive()
+        assert applied[0] == "0"
+        assert applied[-1] == "59"
+        assert len(applied) <= 3
@@ -0,0 +1,143 @@
+import os
+import stat
+import sys
+import threading
+
+import pytest
+
+from rpi_backlight import Backlight, cli
+from rpi_backlight.status import StatusPage, StatusReader
+from rpi_backlight.utils import FakeBacklightSysfs
+
+
+def test_update_read(tmp_path) -> None:
+    path = tmp_path / "status"
+    with StatusPage(path) as status_page, StatusReader(path) as reader:
+        status = reader.read()
+        assert status.sequence == 0
+        assert status.brightness is None
+        assert status.power is None
+
+        status_page.update(power=True)
+        status = reader.read()
+        assert status.sequence == 2
+        assert status.brightness is None
+        assert status.power is True
+        assert status.fading is False
+        assert status.updated > 0
+
+        status_page.update(brightness=42, fading=True)
+        status = reader.read()
+        assert status.sequence == 4
+        assert status.brightness == 42
+        assert status.power is True
+        assert status.fading is True
+
+
+def test_backlight_publishes(tmp_path) -> None:
+    path = tmp_path / "status"
+    with FakeBacklightSysfs() as backlight_sysfs, StatusPage(path) as status_page:
+        backlight = Backlight(
+            backlight_sysfs_path=backlight_sysfs.path, status_page=status_page
+        )
+        reader = StatusReader(path)
+        assert reader.read()[:3] == (100, True, False)
+
+        backlight.brightness = 50
+        assert reader.read()[:3] == (50, True, False)
+
+        backlight.power = False
+        assert reader.read()[:3] == (50, False, False)
+
+        with backlight.fade(duration=0.01):
+            backlight.brightness = 45
+        assert reader.read()[:3] == (45, False, False)
+
+        # A second Backlight publishing to the same page
+        other = Backlight(
+            backlight_sysfs_path=backlight_sysfs.path, status_page=StatusPage(path)
+        )
+        other.power = True
+        assert reader.read()[:3] == (45, True, False)
+
+
+def test_consistent_reads(tmp_path) -> None:
+    path = tmp_path / "status"
+    done = threading.Event()
+
+    def write() -> None:
+        with StatusPage(path) as status_page:
+            value = 0
+            while not done.is_set():
+                value = (value + 1) % 100
+                status_page.update(brightness=value, power=bool(value % 2))
+
+    StatusPage(path).update(brightness=0, power=False)
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        with StatusReader(path) as reader:
+            for _ in range(10000):
+                status = reader.read()
+                assert status.power == bool(int(status.brightness or 0) % 2)
+    finally:
+        done.set()
+        thread.join()
+
+
+def test_crashed_writer(tmp_path) -> None:
+    path = tmp_path / "status"
+    with StatusPage(path) as status_page, StatusReader(path) as reader:
+        status_page.update(brightness=42, power=True)
+
+        # Simulate a writer killed between the two sequence updates
+        status_page._map[0:8] = (5).to_bytes(8, "little")
+        with pytest.raises(RuntimeError):
+            reader.read()
+
+        # The next update repairs the page
+        status_page.update(power=False)
+        status = reader.read()
+        assert status.sequence == 6
+        assert status.brightness == 42
+        assert status.power is False
+
+
+def test_group_writable(tmp_path) -> None:
+    path = tmp_path / "status"
+    old_umask = os.umask(0o022)
+    try:
+        with StatusPage(path):
+            pass
+    finally:
+        os.umask(old_umask)
+    assert stat.S_IMODE(path.stat().st_mode) == 0o664
+
+    # An existing page keeps its mode
+    path.chmod(0o660)
+    with StatusPage(path):
+        pass
+    assert stat.S_IMODE(path.stat().st_mode) == 0o660
+
+
+def test_cli_status_page(monkeypatch, tmp_path) -> None:
+    path = tmp_path / "status"
+    with FakeBacklightSysfs() as backlight_sysfs:
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "rpi-backlight",
+                str(backlight_sysfs.path),
+                "-b",
+                "50",
+                "--status-page",
+                str(path),
+            ],
+        )
+        cli.main()
+
+    with StatusReader(path) as reader:
+        status = reader.read()
+    assert status.brightness == 50
+    assert status.power is True
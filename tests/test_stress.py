@@ -0,0 +1,41 @@
+import pytest
+
+from rpi_backlight.stress import (
+    _final_value_candidates,
+    _torn_raw_brightness,
+    _Write,
+    run_stress,
+)
+from rpi_backlight.utils import FakeBacklightSysfs
+
+
+def test_run_stress() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        result = run_stress(backlight_sysfs.path, threads=2, processes=1, ops=50)
+
+    assert result.ops == 150
+    assert result.ops_per_sec > 0
+    assert set(result.latency) == {"p50", "p95", "p99", "max"}
+    assert result.latency["p50"] <= result.latency["max"]
+    assert result.retries >= 0
+    assert result.torn_writes >= 0
+    assert result.violations == []
+    assert result.errors == []
+
+
+def test_torn_raw_brightness() -> None:
+    torn = _torn_raw_brightness({5, 128, 255})
+    assert torn == {528, 555}
+
+
+def test_final_value_candidates() -> None:
+    # Only the last write can be in the file, anything else is a lost update
+    assert _final_value_candidates([_Write(0, 1, 5), _Write(2, 3, 7)]) == {7}
+    # Either of two overlapping writes may win
+    assert _final_value_candidates([_Write(0, 2.5, 5), _Write(2, 3, 7)]) == {5, 7}
+
+
+def test_run_stress_invalid() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        with pytest.raises(ValueError):
+            run_stress(backlight_sysfs.path, threads=0, processes=0)
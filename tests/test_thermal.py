@@ -0,0 +1,249 @@
+import threading
+
+import pytest
+
+from rpi_backlight import Backlight, BoardType
+from rpi_backlight.thermal import ThermalGovernor
+from rpi_backlight.utils import FakeBacklightSysfs
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def write_temp(path, celsius: float) -> None:
+    path.write_text(f"{int(celsius * 1000)}\n")
+
+
+def test_constructor() -> None:
+    with pytest.raises(ValueError):
+        ThermalGovernor(zones=[], throttle_temp=80, critical_temp=60)
+
+    with pytest.raises(ValueError):
+        ThermalGovernor(zones=[], min_ceiling=101)
+
+    with pytest.raises(ValueError):
+        ThermalGovernor(zones=[], ramp_rate=0)
+
+    with pytest.raises(ValueError):
+        ThermalGovernor(zones=[], min_interval=10, max_interval=1)
+
+
+def test_ceiling_ramp_and_hysteresis(tmp_path) -> None:
+    zone0 = tmp_path / "zone0"
+    zone1 = tmp_path / "zone1"
+    write_temp(zone0, 40)
+    write_temp(zone1, 45)
+    clock = FakeClock()
+    governor = ThermalGovernor(
+        zones=[zone0, zone1, tmp_path / "missing"],
+        throttle_temp=60,
+        critical_temp=80,
+        min_ceiling=20,
+        hysteresis=3,
+        ramp_rate=10,
+        clock=clock,
+    )
+
+    assert governor.ceiling() == 100
+    assert governor.temperature == 45
+
+    # Hottest zone counts, target is 60 at 70°C, reduced by at most 10% per second
+    write_temp(zone1, 70)
+    clock.now += governor.interval
+    assert governor.ceiling() == 80
+    assert governor.temperature == 70
+    clock.now += 1
+    assert governor.ceiling() == 70
+    clock.now += 10
+    assert governor.ceiling() == 60
+
+    # Dropping by less than the hysteresis keeps the ceiling
+    write_temp(zone1, 68)
+    clock.now += 1
+    assert governor.ceiling() == 60
+    assert governor.temperature == 70
+
+    write_temp(zone1, 50)
+    clock.now += 1
+    assert governor.ceiling() == 70
+    clock.now += 10
+    assert governor.ceiling() == 100
+
+
+def test_adaptive_interval(tmp_path) -> None:
+    zone = tmp_path / "zone"
+    write_temp(zone, 30)
+    clock = FakeClock()
+    governor = ThermalGovernor(
+        zones=[zone], min_interval=1, max_interval=8, clock=clock
+    )
+
+    intervals = []
+    for _ in range(5):
+        governor.ceiling()
+        intervals.append(governor.interval)
+        clock.now += governor.interval
+    assert intervals == [2, 4, 8, 8, 8]
+
+    # Not sampled before the interval has elapsed
+    governor.ceiling()
+    write_temp(zone, 90)
+    clock.now += 1
+    governor.ceiling()
+    assert governor.temperature == 30
+
+    clock.now += 8
+    governor.ceiling()
+    assert governor.temperature == 90
+    assert governor.interval == 1
+
+
+def test_low_capacity(tmp_path) -> None:
+    capacity = tmp_path / "capacity"
+    capacity.write_text("15\n")
+    clock = FakeClock()
+    governor = ThermalGovernor(
+        zones=[],
+        capacity_path=capacity,
+        low_capacity=20,
+        low_capacity_ceiling=50,
+        ramp_rate=100,
+        clock=clock,
+    )
+    clock.now += 1
+    assert governor.ceiling() == 50
+
+    # Stays capped until the capacity is clearly above the threshold
+    capacity.write_text("22\n")
+    clock.now += 1
+    assert governor.ceiling() == 50
+
+    capacity.write_text("30\n")
+    clock.now += 1
+    assert governor.ceiling() == 100
+
+
+def test_backlight_respects_ceiling(tmp_path) -> None:
+    zone = tmp_path / "zone"
+    write_temp(zone, 70)
+    clock = FakeClock()
+    governor = ThermalGovernor(
+        zones=[zone],
+        throttle_temp=60,
+        critical_temp=80,
+        min_ceiling=25,
+        ramp_rate=1000,
+        clock=clock,
+    )
+    clock.now += 1
+    assert governor.ceiling() == 62.5
+
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(
+            backlight_sysfs_path=backlight_sysfs.path, governor=governor
+        )
+
+        backlight.brightness = 100
+        assert backlight.brightness == 62
+
+        backlight.brightness = 30
+        assert backlight.brightness == 30
+
+        with backlight.fade(duration=0.01):
+            backlight.brightness = 100
+        assert backlight.brightness == 62
+
+        write_temp(zone, 80)
+        clock.now += 1
+        backlight.fade_duration = 10
+        governor.enforce(backlight)
+        assert backlight.brightness == 25
+        # Enforcing doesn't fade and leaves fade_duration alone
+        assert backlight.fade_duration == 10
+        backlight.fade_duration = 0
+
+        # The requested brightness comes back once it cools down
+        write_temp(zone, 40)
+        clock.now += 1
+        governor.enforce(backlight)
+        assert backlight.brightness == 100
+
+        # Brightness changed by someone else is taken as the new request
+        write_temp(zone, 80)
+        clock.now += 1
+        governor.enforce(backlight)
+        assert backlight.brightness == 25
+        Backlight(backlight_sysfs_path=backlight_sysfs.path).brightness = 10
+        write_temp(zone, 40)
+        clock.now += 1
+        governor.enforce(backlight)
+        assert backlight.brightness == 10
+
+        stop = threading.Event()
+        stop.set()
+        governor.run(backlight, stop)
+
+
+def test_tinker_power_respects_ceiling(tmp_path) -> None:
+    zone = tmp_path / "zone"
+    write_temp(zone, 70)
+    clock = FakeClock()
+    governor = ThermalGovernor(
+        zones=[zone],
+        throttle_temp=60,
+        critical_temp=80,
+        min_ceiling=20,
+        ramp_rate=1000,
+        clock=clock,
+    )
+    clock.now += 1
+
+    with FakeBacklightSysfs() as backlight_sysfs:
+        (backlight_sysfs.path / "tinker_mcu_bl").write_text("255")
+        backlight = Backlight(
+            backlight_sysfs_path=backlight_sysfs.path,
+            board_type=BoardType.TINKER_BOARD,
+            governor=governor,
+        )
+
+        backlight.power = False
+        assert backlight.brightness == 0
+        backlight.power = True
+        assert backlight.brightness == 60
+
+
+def test_enforce_ramps_back_up(tmp_path) -> None:
+    zone = tmp_path / "zone"
+    write_temp(zone, 80)
+    clock = FakeClock()
+    governor = ThermalGovernor(
+        zones=[zone],
+        throttle_temp=60,
+        critical_temp=80,
+        min_ceiling=20,
+        ramp_rate=10,
+        clock=clock,
+    )
+
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(
+            backlight_sysfs_path=backlight_sysfs.path, governor=governor
+        )
+        backlight.brightness = 80
+        clock.now += 10
+        governor.enforce(backlight)
+        assert backlight.brightness == 20
+
+        write_temp(zone, 40)
+        brightness = []
+        for _ in range(8):
+            clock.now += 1
+            governor.enforce(backlight)
+            brightness.append(backlight.brightness)
+        # 10 percent per second, up to the requested brightness
+        assert brightness == [30, 40, 50, 60, 70, 80, 80, 80]
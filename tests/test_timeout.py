@@ -0,0 +1,85 @@
+import errno
+import os
+import threading
+import time
+
+import pytest
+
+from rpi_backlight import Backlight, BacklightTimeoutError
+from rpi_backlight.utils import FakeBacklightSysfs
+
+
+def test_constructor() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        with pytest.raises(ValueError):
+            Backlight(backlight_sysfs_path=backlight_sysfs.path, timeout=0)
+
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path, timeout=1)
+        assert backlight.timeout_count == 0
+        backlight.brightness = 50
+        assert backlight.brightness == 50
+
+
+def test_timeout_and_recovery() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path, timeout=0.1)
+
+        # Opening a FIFO for writing blocks until there is a reader, like a stuck bus
+        brightness = backlight_sysfs.path / "brightness"
+        brightness.unlink()
+        os.mkfifo(brightness)
+
+        with pytest.raises(BacklightTimeoutError) as exc_info:
+            backlight.brightness = 50
+        assert exc_info.value.errno == errno.ETIMEDOUT
+        assert backlight.timeout_count == 1
+
+        # Circuit breaker is open, fail fast without waiting for the timeout
+        start = time.monotonic()
+        with pytest.raises(BacklightTimeoutError):
+            backlight.power = False
+        assert time.monotonic() - start < 0.1
+        assert backlight.timeout_count == 1
+
+        # Let the stuck write complete
+        reader = os.open(brightness, os.O_RDONLY | os.O_NONBLOCK)
+        deadline = time.monotonic() + 2
+        while True:
+            try:
+                backlight.power = False
+                break
+            except BacklightTimeoutError:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+        assert os.read(reader, 16) == b"128"
+        os.close(reader)
+        assert backlight.power is False
+
+
+def io_threads() -> int:
+    return sum(thread.name == "rpi-backlight-io" for thread in threading.enumerate())
+
+
+def test_concurrent_operations() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        io_threads_before = io_threads()
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path, timeout=0.5)
+        errors = []
+
+        def slow_operation() -> None:
+            try:
+                # Together longer than the timeout, but each one is within it
+                backlight._run_io(time.sleep, 0.3)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=slow_operation) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert backlight.timeout_count == 0
+        # Only one worker thread was started
+        assert io_threads() == io_threads_before + 1
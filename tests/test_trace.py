@@ -0,0 +1,139 @@
+import errno
+import time
+
+import pytest
+
+from rpi_backlight import Backlight
+from rpi_backlight.trace import (
+    Tracer,
+    _error_code,
+    load_trace,
+    replay_trace,
+    summarize_trace,
+)
+from rpi_backlight.utils import FakeBacklightSysfs
+
+
+def test_constructor() -> None:
+    with pytest.raises(ValueError):
+        Tracer(capacity=0)
+
+
+def test_attach_detach() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        tracer = Tracer()
+        tracer.attach(backlight)
+
+        backlight.brightness = 50
+        assert backlight.brightness == 50
+        records = tracer.records()
+        assert [(r.op, r.file, r.value, r.errno) for r in records] == [
+            ("write", "brightness", 128, 0),
+            ("read", "actual_brightness", 128, 0),
+        ]
+        assert records[0].timestamp <= records[1].timestamp
+
+        with pytest.raises(FileNotFoundError):
+            backlight._get_value("does_not_exist")
+        assert tracer.records()[-1].errno == errno.ENOENT
+
+        tracer.detach(backlight)
+        backlight.brightness = 0
+        assert len(tracer) == 3
+
+
+def test_record_errors(monkeypatch) -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        tracer = Tracer()
+        tracer.attach(backlight)
+
+        # Backlight replaces EPERM with a PermissionError without errno
+        def not_permitted(*_):
+            raise OSError(errno.EPERM, "Operation not permitted")
+
+        monkeypatch.setattr(backlight, "_run_io", not_permitted)
+        with pytest.raises(PermissionError):
+            backlight.brightness = 50
+        monkeypatch.undo()
+
+        # Invalid content fails after the bounded read retries
+        monkeypatch.setattr(time, "sleep", lambda _: None)
+        (backlight_sysfs.path / "brightness").write_text("foo")
+        with pytest.raises(ValueError):
+            backlight._get_value("brightness")
+
+        records = tracer.records()
+        assert [(r.op, r.file, r.value, r.errno) for r in records] == [
+            ("write", "brightness", 128, errno.EPERM),
+            ("read", "brightness", -1, errno.EINVAL),
+        ]
+        assert summarize_trace(records)["errors"] == {errno.EPERM: 1, errno.EINVAL: 1}
+        assert replay_trace(records)["writes"] == 0
+
+
+def test_error_code() -> None:
+    assert _error_code(FileNotFoundError(errno.ENOENT, "No such file")) == errno.ENOENT
+    assert _error_code(PermissionError("denied")) == errno.EPERM
+    assert _error_code(OSError("no errno")) == errno.EIO
+    assert _error_code(ValueError("foo")) == errno.EINVAL
+
+
+def test_ring_buffer() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        tracer = Tracer(capacity=4)
+        tracer.attach(backlight)
+
+        for value in range(10):
+            backlight._set_value("brightness", value)
+        assert len(tracer) == 4
+        assert [r.value for r in tracer.records()] == [6, 7, 8, 9]
+
+
+def test_dump_load(tmp_path) -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        tracer = Tracer(capacity=8)
+        tracer.attach(backlight)
+
+        for value in range(10):
+            backlight._set_value("brightness", value)
+        backlight.power = False
+        tracer.dump(tmp_path / "trace")
+
+    _, records = load_trace(tmp_path / "trace")
+    assert records == tracer.records()
+    assert records[-1].file == "bl_power"
+
+    (tmp_path / "invalid").write_bytes(b"\0" * 32)
+    with pytest.raises(ValueError):
+        load_trace(tmp_path / "invalid")
+
+
+def test_summarize_and_replay() -> None:
+    with FakeBacklightSysfs() as backlight_sysfs:
+        backlight = Backlight(backlight_sysfs_path=backlight_sysfs.path)
+        tracer = Tracer()
+        tracer.attach(backlight)
+
+        backlight.brightness = 90
+        with backlight.fade(duration=0.1):
+            backlight.brightness = 100
+
+    records = tracer.records()
+    summary = summarize_trace(records)
+    assert summary["writes"] == 11
+    assert summary["errors"] == {}
+    assert len(summary["fades"]) == 1
+    assert summary["fades"][0]["steps"] == 11
+    assert summary["fades"][0]["duration"] >= 0.09
+
+    replayed = replay_trace(records, speed=2)
+    assert replayed["writes"] == 11
+    assert replayed["lateness"]["max"] >= 0
+    assert 0.04 <= replayed["fades"][0]["duration"] < 0.09
+
+    with pytest.raises(ValueError):
+        replay_trace(records, speed=0)
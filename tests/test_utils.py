@@ -3,7 +3,7 @@ from pathlib import Path
 import pytest
 
 from rpi_backlight import BoardType
-from rpi_backlight.utils import FakeBacklightSysfs, detect_board_type
+from rpi_backlight.utils import FakeBacklightSysfs, detect_board_type, percentile
 
 
 def test_fake_sysfs_backlight() -> None:
@@ -40,3 +40,13 @@ def test_detect_board_type(monkeypatch, model, board_type) -> None:
     monkeypatch.setattr(Path, "read_text", lambda self: model)
 
     assert detect_board_type() == board_type
+
+
+def test_percentile() -> None:
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile([3, 1, 2, 4], 100) == 4
+    assert percentile(range(1, 101), 95) == 95  # type: ignore[arg-type]
+    assert percentile([5], 1) == 5
+
+    with pytest.raises(ValueError):
+        percentile([], 50)